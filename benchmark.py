@@ -0,0 +1,1040 @@
+"""Benchmarks for escrow.py. The database ones run against a local, disposable Postgres:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/escrow_bench python benchmark.py db
+    python benchmark.py parser
+    python benchmark.py outbound
+    python benchmark.py journal
+    python benchmark.py sharding --workers 1 2 4 8
+    BENCH_DATABASE_URL=... python benchmark.py persistence --users 10000 100000
+    BENCH_DATABASE_URL=... python benchmark.py partitions --rows 10000000
+    BENCH_DATABASE_URL=... python benchmark.py startup --boots 20
+    BENCH_DATABASE_URL=... python benchmark.py digest --users 100000
+    BENCH_DATABASE_URL=... BENCH_REPLICA_DATABASE_URL=... python benchmark.py replica
+
+    BENCH_DATABASE_URL=... python benchmark.py loadtest --users 200 --actions 50 --output loadtest.json
+    BENCH_DATABASE_URL=... python benchmark.py loadtest --transport webhook --output loadtest-webhook.json
+
+Correctness checks, including the handlers' HANDLER_ROUNDTRIP_BUDGETS, are pytest tests under tests/
+(`python -m pytest -q`).
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import pickle
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+import httpx
+from telegram.ext import ExtBot, TypeHandler
+
+import escrow
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "postgresql://postgres@localhost/escrow_bench")
+BENCH_REPLICA_DATABASE_URL = os.getenv("BENCH_REPLICA_DATABASE_URL", "postgresql://postgres@localhost:5433/escrow_bench")
+BENCH_USER_ID = 1
+
+# The queries behind a dashboard press and a deal forward's duplicate check.
+DB_WORKLOAD = [
+    ("SELECT currency, SUM(received_amount) FROM transactions WHERE status='holding' AND user_id=%s GROUP BY currency", (BENCH_USER_ID,), "all"),
+    ("SELECT currency, SUM(fee) FROM transactions WHERE user_id=%s GROUP BY currency", (BENCH_USER_ID,), "all"),
+    ("SELECT id FROM transactions WHERE user_id=%s AND trade_id=%s", (BENCH_USER_ID, "#T1"), "one"),
+]
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def report(name: str, samples: list[float], elapsed: float):
+    print(f"{name:<10} n={len(samples):<6} p50={percentile(samples, 50) * 1000:7.2f}ms "
+          f"p99={percentile(samples, 99) * 1000:7.2f}ms mean={statistics.mean(samples) * 1000:7.2f}ms "
+          f"throughput={len(samples) / elapsed:8.1f}/s")
+
+async def run_concurrently(query_func, iterations: int, concurrency: int) -> tuple[list[float], float]:
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        sql, params, fetch = DB_WORKLOAD[i % len(DB_WORKLOAD)]
+        async with semaphore:
+            started = time.perf_counter()
+            await query_func(sql, params, fetch)
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    return samples, time.perf_counter() - started
+
+async def seed_transactions(rows: int):
+    await escrow.db_query(
+        "INSERT INTO users (user_id, first_name) VALUES (%s, 'bench') ON CONFLICT DO NOTHING",
+        (BENCH_USER_ID,), fetch="none"
+    )
+    await escrow.db_query(
+        """INSERT INTO transactions (user_id, currency, received_amount, release_amount, fee, trade_id, received_date, status)
+           SELECT %s, CASE WHEN g %% 2 = 0 THEN 'inr' ELSE 'crypto' END, 100, 99, 1, '#T' || g,
+                  now() - g * interval '1 minute', CASE WHEN g %% 10 = 0 THEN 'holding' ELSE 'completed' END
+           FROM generate_series(1, %s) AS g
+           ON CONFLICT DO NOTHING""",
+        (BENCH_USER_ID, rows), fetch="none"
+    )
+
+def legacy_db_query_factory(dsn: str, max_conn: int):
+    """The pre-asyncio path: psycopg2 pool + run_in_executor + time.sleep retries. The threaded pool is
+    used so the baseline does not corrupt itself under concurrency; it is otherwise the same code."""
+    import psycopg2
+    from psycopg2 import pool
+    from functools import partial
+
+    legacy_pool = pool.ThreadedConnectionPool(1, max_conn, dsn=dsn)
+
+    def _sync_db_query(sql, params, fetch):
+        for attempt in range(3):
+            conn = None
+            try:
+                conn = legacy_pool.getconn()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    result = cur.fetchone() if fetch == "one" else cur.fetchall()
+                legacy_pool.putconn(conn)
+                return result
+            except psycopg2.OperationalError:
+                if conn:
+                    legacy_pool.putconn(conn, close=True)
+                time.sleep(0.5 * (attempt + 1))
+        raise RuntimeError("legacy query failed")
+
+    async def legacy_db_query(sql, params, fetch):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(_sync_db_query, sql, params, fetch))
+
+    return legacy_db_query, legacy_pool
+
+async def bench_db(args):
+    escrow.DATABASE_URL = args.dsn
+    escrow.DB_POOL_MAX_SIZE = args.pool_size
+    await escrow.initialize_db_pool()
+    await seed_transactions(args.rows)
+
+    async def async_db_query(sql, params, fetch):
+        return await escrow.db_query(sql, params, fetch=fetch)
+
+    legacy_db_query, legacy_pool = legacy_db_query_factory(args.dsn, args.pool_size)
+    try:
+        for name, func in (("legacy", legacy_db_query), ("asyncio", async_db_query)):
+            await run_concurrently(func, min(200, args.iterations), args.concurrency)  # warm up
+            samples, elapsed = await run_concurrently(func, args.iterations, args.concurrency)
+            report(name, samples, elapsed)
+    finally:
+        legacy_pool.closeall()
+        await escrow.close_db_pool()
+
+SAMPLE_INR_DEAL = (
+    "🤝 Continue the Deal\n\n🆔 Trade ID: #TRX48213\n👤 Buyer : @buyer_handle\n👤 Seller : @seller_handle\n"
+    "Received Amount : ₹1,25,000.00\nEscrow Fee : ₹1,250.00\nRelease Amount : ₹1,23,750.00\n"
+    "Escrowed By : @escrow_desk_7\n\nPlease continue the deal once both parties confirm."
+)
+SAMPLE_CRYPTO_DEAL = (
+    "🤝 Continue the Deal\n\n🆔 Trade ID: #CRY90311\n👤 Buyer : @buyer_handle\n👤 Seller : @seller_handle\n"
+    "Received Amount : 2,450.75$\nNetwork : TRC20\nEscrowed By : @escrow_desk_2\n\n"
+    "Please continue the deal once both parties confirm."
+)
+
+def legacy_parse_deal_message(msg: str):
+    """The pre-compiled-parser extraction: up to five uncompiled re.search calls."""
+    trade_id = re.search(r"🆔?\s*Trade ID: (#\w+)", msg).group(1)
+    escrowed_by = re.search(r"Escrowed By : (.*?)(\n|$)", msg).group(1).strip()
+    if '₹' in msg:
+        received = float(re.search(r"Received Amount : ₹([\d,]+\.?\d*)", msg).group(1).replace(',', ''))
+        fee = float(re.search(r"Escrow Fee : ₹([\d,]+\.?\d*)", msg).group(1).replace(',', ''))
+        return trade_id, escrowed_by, "inr", received, fee
+    received = float(re.search(r"Received Amount : ([\d,]+\.?\d*)\$", msg).group(1).replace(',', ''))
+    return trade_id, escrowed_by, "crypto", received, None
+
+async def bench_parser(args):
+    for label, msg in (("inr", SAMPLE_INR_DEAL), ("crypto", SAMPLE_CRYPTO_DEAL)):
+        parsed = escrow.parse_deal_message(msg)
+        assert legacy_parse_deal_message(msg) == (parsed.trade_id, parsed.escrowed_by, parsed.currency, parsed.received_amount, parsed.fee)
+        for name, func in (("legacy", legacy_parse_deal_message), ("compiled", escrow.parse_deal_message)):
+            best = min(timeit.repeat(lambda: func(msg), number=args.iterations, repeat=5))
+            print(f"{label:<7} {name:<9} {best / args.iterations * 1e6:7.2f}µs/message")
+
+def sample_user_data(uid: int) -> dict:
+    return {
+        'original_user_id': uid,
+        'pending_crypto_deals': {
+            f"#CRY{uid}{n}": {'escrowed_by': '@escrow_desk_2', 'received_amount': 2450.75} for n in range(3)
+        },
+    }
+
+def bench_pickle_file(user_data: dict) -> tuple[float, float]:
+    """PicklePersistence(single_file=True) re-pickles every user into one file per flush and
+    unpickles all of it at startup; this times exactly that dump/load."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bot_persistence.pickle")
+        started = time.perf_counter()
+        with open(path, "wb") as f:
+            pickle.dump({'user_data': user_data, 'chat_data': {}, 'bot_data': {}, 'conversations': {}}, f)
+        flush = time.perf_counter() - started
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            pickle.load(f)
+        return flush, time.perf_counter() - started
+
+async def bench_postgres_persistence(user_data: dict, touched: int) -> tuple[float, float]:
+    await escrow.db_query("DELETE FROM bot_state WHERE kind = 'user'", fetch="none")
+    seed = escrow.PostgresPersistence()
+    seed._loaded_users.update(user_data)
+    await asyncio.gather(*(seed.update_user_data(uid, data) for uid, data in user_data.items()))
+
+    # Startup: construct and load (nothing, it is lazy), then the first user's update loads their row.
+    active = list(user_data)[:touched]
+    started = time.perf_counter()
+    persistence = escrow.PostgresPersistence()
+    memory = await persistence.get_user_data()
+    memory[active[0]] = {}
+    await persistence.refresh_user_data(active[0], memory[active[0]])
+    startup = time.perf_counter() - started
+    for uid in active[1:]:
+        memory[uid] = {}
+        await persistence.refresh_user_data(uid, memory[uid])
+
+    # Flush: the Application hands over every user touched since the last pass; a tenth changed.
+    for n, uid in enumerate(list(memory)):
+        if n % 10 == 0:
+            memory[uid]['managed_user_id'] = n
+    started = time.perf_counter()
+    await asyncio.gather(*(persistence.update_user_data(uid, pickle.loads(pickle.dumps(data))) for uid, data in memory.items()))
+    await persistence.flush()
+    return time.perf_counter() - started, startup
+
+async def bench_persistence(args):
+    escrow.DATABASE_URL = args.dsn
+    await escrow.initialize_db_pool()
+    try:
+        for users in args.users:
+            user_data = {uid: sample_user_data(uid) for uid in range(1, users + 1)}
+            pickle_flush, pickle_startup = bench_pickle_file(user_data)
+            pg_flush, pg_startup = await bench_postgres_persistence(user_data, args.touched)
+            print(f"users={users:<7} pickle   flush={pickle_flush * 1000:9.1f}ms startup={pickle_startup * 1000:9.1f}ms")
+            print(f"{'':<13} bot_state flush={pg_flush * 1000:9.1f}ms startup={pg_startup * 1000:9.1f}ms "
+                  f"({args.touched} users touched per flush)")
+    finally:
+        await escrow.close_db_pool()
+
+class FakeBotAPI:
+    """Just enough of the Bot API for the handlers: every method succeeds, and methods that return a
+    Message get a plausible one for the request's chat_id. Each response waits `latency` seconds."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls: dict[str, int] = {}
+        self.next_message_id = 0
+        self.updates: asyncio.Queue = asyncio.Queue()  # served to getUpdates in polling mode
+        self.flood_every = 0  # answer every Nth sendMessage with a 429, as Telegram does under load
+        self.sends = 0
+        self.messages_to: dict[int, int] = {}
+
+    def _message(self, chat_id: int) -> dict:
+        self.next_message_id += 1
+        return {"message_id": self.next_message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "text": "ok"}
+
+    async def respond(self, method: str, content_type: str, body: bytes):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        elif content_type.startswith("application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = {m.group(1).decode(): m.group(2).decode() for m in re.finditer(rb'name="(\w+)"\r\n\r\n([^\r]*)', body)}
+        if method == "getUpdates":
+            try:
+                batch = [await asyncio.wait_for(self.updates.get(), timeout=max(float(params.get("timeout", 0)), 0.01))]
+            except asyncio.TimeoutError:
+                return []
+            while not self.updates.empty() and len(batch) < 100:
+                batch.append(self.updates.get_nowait())
+            return batch
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Escrow Load", "username": "escrow_load_bot"}
+        if method in ("sendMessage", "editMessageText", "sendDocument"):
+            chat_id = int(params.get("chat_id", 0))
+            self.messages_to[chat_id] = self.messages_to.get(chat_id, 0) + 1
+            return self._message(chat_id)
+        if method == "copyMessage":
+            self.next_message_id += 1
+            return {"message_id": self.next_message_id}
+        return True
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while request_line := await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                method = request_line.split()[1].decode().rsplit("/", 1)[-1]
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if method == "sendMessage":
+                    self.sends += 1
+                if method == "sendMessage" and self.flood_every and self.sends % self.flood_every == 0:
+                    self.calls["429"] = self.calls.get("429", 0) + 1
+                    status, payload = b"429 Too Many Requests", {
+                        "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1", "parameters": {"retry_after": 1}
+                    }
+                else:
+                    status, payload = b"200 OK", {"ok": True, "result": await self.respond(method, headers.get("content-type", ""), body)}
+                payload = json.dumps(payload).encode()
+                writer.write(b"HTTP/1.1 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n" % (status, len(payload)) + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+class LoadUser:
+    """One synthetic user: forwards deals, opens dashboards, releases and completes deals."""
+    ACTIONS = [("forward_inr", 30), ("forward_crypto", 10), ("dashboard", 30), ("release", 15), ("complete", 15)]
+
+    def __init__(self, harness, user_id: int):
+        self.harness, self.user_id = harness, user_id
+        self.pending: list[tuple[str, float]] = []  # (trade_id, forwarded at)
+        self.deal_seq = 0
+
+    def settled_deal(self) -> str | None:
+        # INR deals are inserted after DEAL_BATCH_WINDOW; only act on ones that have landed.
+        cutoff = time.monotonic() - escrow.DEAL_BATCH_WINDOW - 0.5
+        for i, (trade_id, forwarded_at) in enumerate(self.pending):
+            if forwarded_at < cutoff:
+                return self.pending.pop(i)[0]
+        return None
+
+    def next_trade_id(self, prefix: str) -> str:
+        self.deal_seq += 1
+        return f"#{prefix}{self.user_id % 10**6}X{self.deal_seq}"
+
+    async def run(self, actions: int, think: float):
+        h = self.harness
+        await h.send("dashboard", h.message(self.user_id, escrow.BTN_INR_DASH))
+        names, weights = zip(*self.ACTIONS)
+        for _ in range(actions):
+            action = random.choices(names, weights)[0]
+            if action == "forward_inr":
+                trade_id = self.next_trade_id("L")
+                await h.send(action, h.message(self.user_id, SAMPLE_INR_DEAL.replace("#TRX48213", trade_id), forwarded=True))
+                self.pending.append((trade_id, time.monotonic()))
+            elif action == "forward_crypto":
+                trade_id = self.next_trade_id("C")
+                await h.send(action, h.message(self.user_id, SAMPLE_CRYPTO_DEAL.replace("#CRY90311", trade_id), forwarded=True))
+                await h.send("select_fee", h.callback(self.user_id, f"{escrow.CALLBACK_FEE_SELECT_PREFIX}1.0|||{trade_id}"))
+                self.pending.append((trade_id, 0.0))
+            elif action == "dashboard":
+                await h.send(action, h.message(self.user_id, random.choice([escrow.BTN_INR_DASH, escrow.BTN_CRYPTO_DASH, escrow.BTN_TOTAL_FUNDS])))
+            elif (trade_id := self.settled_deal()) is None:
+                continue
+            elif action == "release":
+                await h.send(action, h.message(self.user_id, f"Release {trade_id} (₹1.00)"))
+            else:
+                await h.send(action, h.message(self.user_id, f"✅ Deal Completed\n\nTrade ID: {trade_id}", forwarded=True))
+            if think:
+                await asyncio.sleep(random.uniform(0, 2 * think))
+
+class LoadHarness:
+    """Delivers synthesized updates over one transport and times each until its handlers finish:
+    `direct` calls process_update; `polling` serves them to the Updater through the fake getUpdates;
+    `webhook` POSTs them to the bot's webhook listener. The last two go through the update queue,
+    so their numbers are comparable with each other."""
+
+    def __init__(self, application, transport: str, api: FakeBotAPI):
+        self.application, self.transport, self.api = application, transport, api
+        self.samples: dict[str, list[float]] = {}
+        self.update_id = 0
+        self.waiters: dict[int, asyncio.Future] = {}
+        self.webhook_url = None
+        self.client = None
+        # Runs after every other handler group, so it fires once the update is fully handled.
+        application.add_handler(TypeHandler(escrow.Update, self._completed), group=99)
+
+    async def _completed(self, update, context):
+        waiter = self.waiters.pop(update.update_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"load{user_id}", "username": f"load{user_id}"}
+
+    def message(self, user_id: int, text: str, forwarded: bool = False) -> dict:
+        self.update_id += 1
+        message = {
+            "message_id": self.update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id),
+        }
+        if forwarded:
+            message["forward_date"] = int(time.time())
+            message["forward_origin"] = {"type": "hidden_user", "sender_user_name": "desk", "date": int(time.time())}
+        return {"update_id": self.update_id, "message": message}
+
+    def callback(self, user_id: int, data: str) -> dict:
+        self.update_id += 1
+        return {"update_id": self.update_id, "callback_query": {
+            "id": str(self.update_id), "from": self._user(user_id), "chat_instance": str(user_id), "data": data,
+            "message": {"message_id": self.update_id, "date": int(time.time()), "chat": {"id": user_id, "type": "private"}, "text": "…"},
+        }}
+
+    async def send(self, action: str, data: dict):
+        started = time.perf_counter()
+        if self.transport == "direct":
+            await self.application.process_update(escrow.Update.de_json(data, self.application.bot))
+        else:
+            waiter = self.waiters[data["update_id"]] = asyncio.get_running_loop().create_future()
+            if self.transport == "polling":
+                self.api.updates.put_nowait(data)
+            else:
+                response = await self.client.post(self.webhook_url, json=data, headers={"X-Telegram-Bot-Api-Secret-Token": escrow.WEBHOOK_SECRET})
+                response.raise_for_status()
+            await waiter
+        self.samples.setdefault(action, []).append(time.perf_counter() - started)
+
+    async def run_admin(self, interval: float, stop: asyncio.Event):
+        admin = escrow.BOT_OWNER_ID
+        await self.send("admin_menu", self.message(admin, escrow.BTN_BACK_TO_ADMIN_PANEL))
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            if stop.is_set():
+                break
+            await self.send("admin_export", self.message(admin, escrow.BTN_ADMIN_EXPORT_DATA))
+            await self.send("admin_broadcast", self.message(admin, escrow.BTN_ADMIN_BROADCAST))
+            await self.send("admin_broadcast", self.message(admin, "Load test broadcast"))
+            await self.send("admin_broadcast", self.message(admin, "yes"))
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+async def bench_loadtest(args):
+    escrow.DATABASE_URL = args.dsn
+    journal_dir = tempfile.TemporaryDirectory()
+    escrow.DEAL_JOURNAL_PATH = os.path.join(journal_dir.name, "deal_journal.jsonl")
+    escrow.METRICS_PORT = 0
+    api = FakeBotAPI(args.api_latency / 1000)
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    if not args.flood_limits:
+        # The fake server has no flood limits; measure the bot, not Telegram's budgets.
+        escrow.OUTBOUND_GLOBAL_RATE = escrow.OUTBOUND_CHAT_RATE = escrow.OUTBOUND_CHAT_BURST = 10_000
+    application = escrow.build_application(token="123456:LOADTEST", base_url=f"http://127.0.0.1:{port}/bot")
+    harness = LoadHarness(application, args.transport, api)
+    user_ids = [args.first_user_id + i for i in range(args.users)]
+
+    await application.initialize()
+    await escrow.on_startup(application)
+    await application.start()
+    webhook_server = None
+    if args.transport == "polling":
+        await application.updater.start_polling(poll_interval=0, timeout=10)
+    elif args.transport == "webhook":
+        escrow.WEBHOOK_URL = "http://127.0.0.1/telegram"
+        webhook_server = await escrow.start_http_server("127.0.0.1", 0, escrow.webhook_routes(application))
+        harness.webhook_url = f"http://127.0.0.1:{webhook_server.sockets[0].getsockname()[1]}/telegram"
+        harness.client = httpx.AsyncClient(limits=httpx.Limits(max_connections=escrow.WEBHOOK_MAX_CONNECTIONS))
+    stop_admin = asyncio.Event()
+    admin_task = asyncio.create_task(harness.run_admin(args.admin_interval, stop_admin))
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(LoadUser(harness, uid).run(args.actions, args.think_ms / 1000) for uid in user_ids))
+        elapsed = time.perf_counter() - started
+        stop_admin.set()
+        await admin_task
+        # Let deferred deal batches, exports and broadcasts finish before tearing down.
+        await asyncio.sleep(escrow.DEAL_BATCH_WINDOW + 0.5)
+        while await escrow.db_query("SELECT 1 FROM broadcasts WHERE status = 'running' LIMIT 1", fetch="one"):
+            await asyncio.sleep(0.5)
+    finally:
+        stop_admin.set()
+        if application.updater.running:
+            await application.updater.stop()
+        if webhook_server is not None:
+            await harness.client.aclose()
+            webhook_server.close()
+        await application.stop()
+        await application.shutdown()
+        await escrow.db_query("DELETE FROM users WHERE user_id = ANY(%s)", (user_ids,), fetch="none")
+        await escrow.db_query("DELETE FROM bot_state WHERE kind = 'user' AND key = ANY(%s)", ([str(uid) for uid in user_ids],), fetch="none")
+        await escrow.on_shutdown(application)
+        journal_dir.cleanup()
+        server.close()
+
+    updates = sum(len(samples) for samples in harness.samples.values())
+    results = {
+        "commit": current_commit(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("func", "dsn")},
+        "elapsed_s": round(elapsed, 3),
+        "updates": updates,
+        "throughput_per_s": round(updates / elapsed, 1),
+        "actions": {
+            action: {
+                "n": len(samples),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+                "mean_ms": round(statistics.mean(samples) * 1000, 2),
+            }
+            for action, samples in sorted(harness.samples.items())
+        },
+        "handlers": {
+            handler: {"n": count, "mean_ms": round(total / count * 1000, 2)}
+            for handler, (_, total, count) in sorted(escrow.HANDLER_SECONDS.values.items())
+        },
+        "db_round_trips": dict(sorted(escrow.HANDLER_ROUND_TRIPS.values.items())),
+        "outbound_wait": {
+            priority: {"n": count, "mean_ms": round(total / count * 1000, 2)}
+            for priority, (_, total, count) in sorted(escrow.OUTBOUND_WAIT_SECONDS.values.items())
+        },
+        "bot_api_calls": dict(sorted(api.calls.items())),
+    }
+    print(f"{updates} updates in {elapsed:.1f}s ({results['throughput_per_s']}/s)")
+    for action, stats in results["actions"].items():
+        print(f"{action:<16} n={stats['n']:<6} p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+async def bench_outbound(args):
+    """OutboundScheduler against the fake Bot API, which answers every Nth send with a 429: a
+    background stream to many chats, interactive replies started while it runs, and a burst of
+    queued texts to one chat. Exits non-zero if a RetryAfter reached the caller."""
+    api = FakeBotAPI(args.api_latency / 1000)
+    api.flood_every = args.flood_every
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    scheduler = escrow.OutboundScheduler()
+    bot = ExtBot("123456:OUTBOUND", base_url=f"http://127.0.0.1:{port}/bot", rate_limiter=scheduler)
+    await bot.initialize()
+    latencies = {"interactive": [], "background": []}
+    failures = []
+
+    async def send(kind: str, chat_id: int):
+        started = time.perf_counter()
+        try:
+            await bot.send_message(chat_id=chat_id, text=f"{kind} to {chat_id}")
+        except escrow.RetryAfter as e:
+            failures.append(f"{kind} send to {chat_id} raised {e}")
+        latencies[kind].append(time.perf_counter() - started)
+
+    @escrow.background_traffic
+    async def background():
+        await asyncio.gather(*(send("background", 100_000 + i) for i in range(args.background)))
+
+    started = time.perf_counter()
+    background_task = asyncio.create_task(background())
+    await asyncio.sleep(1)
+    await asyncio.gather(*(send("interactive", 200_000 + i) for i in range(args.interactive)))
+    for i in range(args.burst):
+        await escrow.send_later(bot, 1, f"Deal #{i} added.")
+    await background_task
+    await scheduler.shutdown()
+    elapsed = time.perf_counter() - started
+    await bot.shutdown()
+    server.close()
+
+    for kind, samples in latencies.items():
+        report(kind, samples, elapsed)
+    print(f"burst of {args.burst} queued texts to one chat went out as {api.messages_to.get(1, 0)} messages; "
+          f"{api.calls.get('429', 0)} sends got a 429 and were retried")
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+async def bench_journal(args):
+    """Deal journal append latency with `--concurrency` forwards in flight (each append waits for its
+    fsync; concurrent ones share it), then a replay of the file as after a crash. No database."""
+    with tempfile.TemporaryDirectory() as journal_dir:
+        path = os.path.join(journal_dir, "deal_journal.jsonl")
+        journal = escrow.DealJournal(path)
+        journal.open()
+        user = SimpleNamespace(id=BENCH_USER_ID, first_name="bench", username="bench")
+        semaphore = asyncio.Semaphore(args.concurrency)
+        samples = []
+
+        async def forward(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                await journal.append(escrow.journal_entry(
+                    "deal", user, BENCH_USER_ID, f"#J{i}", currency="inr", received_amount=1000.0, fee=10.0, escrowed_by="@desk"
+                ))
+                samples.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(forward(i) for i in range(args.entries)))
+        report("append", samples, time.perf_counter() - started)
+        _, fsync_total, fsyncs = escrow.JOURNAL_FSYNC_SECONDS.values[""]
+        print(f"{fsyncs} fsyncs for {args.entries} entries ({fsync_total / fsyncs * 1000:.2f}ms each), "
+              f"{os.path.getsize(path) / args.entries:.0f} bytes/entry")
+        with open(path, "ab") as f:
+            f.write(b'{"op":"deal","torn')  # a crash mid-write
+        replayed = escrow.DealJournal(path)
+        count = replayed.open()
+        replayed._file.close()
+        journal._file.close()
+    if count != args.entries:
+        print(f"FAIL replay found {count} of {args.entries} acknowledged entries")
+        sys.exit(1)
+    print(f"ok: replay recovered all {count} entries and dropped the torn tail")
+
+def sharding_bench_worker(index: int, workers: int, queue, ready, results, work: int):
+    """A worker process that does the CPU-bound part of a deal forward (decode, parse, render the
+    confirmation) `work` times per update and reports the order it saw each user's updates in."""
+    ready.set()
+    seen = []
+    while (data := queue.get()) is not None:
+        update = escrow.Update.de_json(data, None)
+        for _ in range(work):
+            deal = escrow.parse_deal_message(update.message.text)
+            escrow.deal_confirmation_text([deal], {deal.trade_id})
+        seen.append((update.effective_user.id, update.update_id))
+    results.put(seen)
+
+def sharding_updates(users: int, per_user: int) -> list:
+    updates, update_id = [], 0
+    for seq in range(per_user):
+        for user_id in range(1, users + 1):
+            update_id += 1
+            updates.append(escrow.Update.de_json({
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id, "date": int(time.time()), "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"},
+                    "text": SAMPLE_INR_DEAL.replace("#TRX48213", f"#S{user_id}X{seq}"),
+                },
+            }, None))
+    return updates
+
+async def bench_sharding(args):
+    """Throughput of the front process + N workers layout as N grows, with CPU-bound stand-in
+    handlers so the database is out of the picture. Also checks every user's updates were handled in
+    order by a single worker."""
+    updates = sharding_updates(args.users, args.updates_per_user)
+    baseline, failures = None, []
+    for workers in args.workers:
+        results = multiprocessing.get_context("spawn").Queue()
+        router = escrow.ShardedUpdates(workers, target=sharding_bench_worker, args=(results, args.work))
+        router.start()
+        started = time.perf_counter()
+        for update in updates:
+            router.route(update)
+        router.send_stop()
+        seen = [results.get() for _ in range(workers)]
+        elapsed = time.perf_counter() - started
+        router.join()
+        owner: dict[int, int] = {}
+        last: dict[int, int] = {}
+        for worker, entries in enumerate(seen):
+            for user_id, update_id in entries:
+                if owner.setdefault(user_id, worker) != worker:
+                    failures.append(f"user {user_id} was handled by more than one worker")
+                if update_id <= last.get(user_id, 0):
+                    failures.append(f"user {user_id}: update {update_id} ran after {last[user_id]}")
+                last[user_id] = update_id
+        throughput = len(updates) / elapsed
+        baseline = baseline or throughput
+        print(f"workers={workers:<3} {len(updates)} updates in {elapsed:6.2f}s  {throughput:9.1f}/s  "
+              f"x{throughput / baseline:.2f}  per-worker {[len(entries) for entries in seen]}")
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+PARTITION_BENCH_TABLES = ("bench_tx_plain", "bench_tx_part")
+# A holding-dashboard lookup, a release by trade id, and a scan across the edge of two months.
+PARTITION_WORKLOAD = [
+    ("holding", "SELECT currency, SUM(received_amount) FROM {table} WHERE status = 'holding' AND user_id = %s GROUP BY currency"),
+    ("release", "UPDATE {table} SET status = status WHERE user_id = %s AND trade_id = %s AND status = 'holding'"),
+    ("month_edge", "SELECT COUNT(*), SUM(fee) FROM {table} WHERE received_date >= %s AND received_date < %s"),
+]
+
+async def create_partition_bench_tables(conn, rows: int, months: int, users: int):
+    for table in PARTITION_BENCH_TABLES:
+        await conn.execute(f"DROP TABLE IF EXISTS {table}", prepare=False)
+    columns = """id BIGINT NOT NULL, user_id BIGINT NOT NULL, currency TEXT, received_amount REAL, fee REAL,
+                 trade_id TEXT, status TEXT, received_date TIMESTAMPTZ NOT NULL"""
+    await conn.execute(f"CREATE UNLOGGED TABLE bench_tx_plain ({columns}, PRIMARY KEY (id))", prepare=False)
+    await conn.execute(
+        f"CREATE UNLOGGED TABLE bench_tx_part ({columns}, PRIMARY KEY (id, received_date)) PARTITION BY RANGE (received_date)",
+        prepare=False
+    )
+    for month in range(months + 1):
+        await conn.execute(f"""
+            CREATE UNLOGGED TABLE bench_tx_part_{month} PARTITION OF bench_tx_part FOR VALUES
+            FROM (date_trunc('month', now()) - interval '{months - month} months')
+            TO (date_trunc('month', now()) - interval '{months - month - 1} months')
+        """, prepare=False)
+    # Only the last ~2 weeks hold 'holding' deals; everything older is completed, as in production.
+    await conn.execute(f"""
+        INSERT INTO bench_tx_plain
+        SELECT g, g %% {users}, CASE WHEN g %% 2 = 0 THEN 'inr' ELSE 'crypto' END, 100, 1, '#T' || g,
+               CASE WHEN g > %s - %s / ({months} * 2) AND g %% 10 = 0 THEN 'holding' ELSE 'completed' END,
+               date_trunc('month', now()) - interval '{months} months'
+                   + (g::double precision / %s) * (now() - (date_trunc('month', now()) - interval '{months} months'))
+        FROM generate_series(1, %s) AS g
+    """, (rows, rows, rows, rows), prepare=False)
+    await conn.execute("INSERT INTO bench_tx_part SELECT * FROM bench_tx_plain", prepare=False)
+    for table in PARTITION_BENCH_TABLES:
+        await conn.execute(f"CREATE INDEX ON {table} (user_id, status)", prepare=False)
+        await conn.execute(f"CREATE INDEX ON {table} (received_date)", prepare=False)
+        await conn.execute(f"CREATE INDEX ON {table} (user_id, trade_id) WHERE status = 'holding'", prepare=False)
+        await conn.execute(f"VACUUM ANALYZE {table}", prepare=False)
+
+async def bench_partitions(args):
+    """Same rows, plain table vs monthly partitions: latency of the hot queries, then the cost of
+    retiring the oldest month (DELETE on the plain table vs DETACH CONCURRENTLY)."""
+    escrow.DATABASE_URL = args.dsn
+    await escrow.initialize_db_pool()
+    try:
+        async with escrow.db_connection() as conn:
+            started = time.perf_counter()
+            await create_partition_bench_tables(conn, args.rows, args.months, args.users)
+            print(f"seeded {args.rows:,} rows over {args.months} months in {time.perf_counter() - started:.1f}s")
+            cur = await conn.execute("SELECT date_trunc('month', now()) - interval '1 month'", prepare=False)
+            edge = (await cur.fetchone())[0]
+            for name, sql in PARTITION_WORKLOAD:
+                for table in PARTITION_BENCH_TABLES:
+                    samples = []
+                    started = time.perf_counter()
+                    for i in range(args.iterations):
+                        user_id = random.randrange(args.users)
+                        params = {
+                            "holding": (user_id,),
+                            "release": (user_id, f"#T{args.rows - random.randrange(args.rows // (args.months * 2))}"),
+                            "month_edge": (edge - timedelta(days=1), edge + timedelta(days=1)),
+                        }[name]
+                        query_started = time.perf_counter()
+                        await conn.execute(sql.format(table=table), params)
+                        samples.append(time.perf_counter() - query_started)
+                    report(f"{name}:{table.removeprefix('bench_tx_')}", samples, time.perf_counter() - started)
+            started = time.perf_counter()
+            await conn.execute(
+                "DELETE FROM bench_tx_plain WHERE received_date < date_trunc('month', now()) - %s * interval '1 month'",
+                (args.months - 1,), prepare=False
+            )
+            print(f"retire oldest month, plain DELETE:         {time.perf_counter() - started:8.3f}s")
+            started = time.perf_counter()
+            await conn.execute("ALTER TABLE bench_tx_part DETACH PARTITION bench_tx_part_0 CONCURRENTLY", prepare=False)
+            print(f"retire oldest month, DETACH CONCURRENTLY:  {time.perf_counter() - started:8.3f}s")
+            if not args.keep:
+                await conn.execute("DROP TABLE IF EXISTS bench_tx_plain, bench_tx_part, bench_tx_part_0", prepare=False)
+    finally:
+        await escrow.close_db_pool()
+
+async def bench_startup(args):
+    """Boot cost: time until `initialize_db_pool` returns and until the pool is warm, with the
+    versioned schema check vs re-running the base schema DDL on every boot as startup used to. Then
+    checks that two workers migrating at once apply a pending migration exactly once."""
+    escrow.DATABASE_URL = args.dsn
+    escrow.DB_POOL_MIN_SIZE = args.pool_size
+    await escrow.initialize_db_pool()
+    await escrow.close_db_pool()
+    for name in ("versioned", "ddl-every-boot"):
+        ready, warm = [], []
+        started = time.perf_counter()
+        for _ in range(args.boots):
+            boot_started = time.perf_counter()
+            await escrow.initialize_db_pool()
+            if name == "ddl-every-boot":
+                async with escrow.db_connection() as conn, conn.transaction():
+                    await escrow._migration_base_schema(conn)
+            ready.append(time.perf_counter() - boot_started)
+            await escrow.warm_db_pool()
+            warm.append(time.perf_counter() - boot_started)
+            await escrow.close_db_pool()
+        elapsed = time.perf_counter() - started
+        report(f"ready:{name}", ready, elapsed)
+        report(f"warm:{name}", warm, elapsed)
+
+    async def migrate() -> list[int]:
+        async with escrow.db_connection() as conn:
+            return await escrow.migrate_schema(conn)
+
+    await escrow.initialize_db_pool()
+    failures = []
+    try:
+        async with escrow.db_connection() as conn:
+            await conn.execute("DROP INDEX IF EXISTS idx_transactions_user_currency_holding", prepare=False)
+            await conn.execute("DELETE FROM schema_version WHERE version = %s", (escrow.SCHEMA_VERSION,), prepare=False)
+        started = time.perf_counter()
+        results = await asyncio.gather(migrate(), migrate())
+        print(f"concurrent migrate: {results} in {time.perf_counter() - started:.2f}s")
+        if sorted(results) != [[], [escrow.SCHEMA_VERSION]]:
+            failures.append(f"expected migration {escrow.SCHEMA_VERSION} to be applied once, got {results}")
+        row = await escrow.db_query(
+            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass('idx_transactions_user_currency_holding')", fetch="one"
+        )
+        if not (row and row[0]):
+            failures.append("idx_transactions_user_currency_holding is missing or invalid after the rebuild")
+    finally:
+        await escrow.close_db_pool()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok: pending migrations ran once and the index was rebuilt valid")
+
+class DigestBot:
+    """Counts digest sends; each takes `latency` seconds like a Bot API round trip."""
+    rate_limiter = None
+
+    def __init__(self, latency: float):
+        self.latency, self.sent = latency, set()
+
+    async def send_message(self, chat_id: int, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent.add(chat_id)
+        return SimpleNamespace(message_id=1)
+
+async def bench_digest(args):
+    """Seeds `--users` subscribers with yesterday's rollups, then compares the digest's one grouped
+    query with the per-user report query it replaces and times full digest runs: one at `--rate`,
+    one cut short by DIGEST_MAX_SECONDS to check the run stays bounded."""
+    escrow.DATABASE_URL = args.dsn
+    await escrow.initialize_db_pool()
+    first, last = args.first_user_id, args.first_user_id + args.users - 1
+    day = datetime.now(escrow.IST).date() - timedelta(days=1)
+    failures = []
+    try:
+        await escrow.db_query(
+            """INSERT INTO users (user_id, first_name, digest_enabled) SELECT g, 'bench', true FROM generate_series(%s, %s) AS g
+               ON CONFLICT (user_id) DO UPDATE SET digest_enabled = true, blocked_at = NULL""",
+            (first, last), fetch="none"
+        )
+        await escrow.db_query(
+            """INSERT INTO user_daily_stats (user_id, currency, day, fees_total, volume_total, deal_count)
+               SELECT g, c, %s, 1, 100, 1 FROM generate_series(%s, %s) AS g, unnest(ARRAY['inr', 'crypto']) AS c
+               ON CONFLICT DO NOTHING""",
+            (day, first, last), fetch="none"
+        )
+        started = time.perf_counter()
+        rows = await escrow.db_query(escrow.DIGEST_SQL, (day,), intent="read")
+        grouped = time.perf_counter() - started
+        print(f"grouped query: {len(rows):,} rows for {args.users:,} subscribers in {grouped * 1000:,.1f}ms")
+        start_utc, end_utc = escrow.ist_midnight_utc(day), escrow.ist_midnight_utc(day + timedelta(days=1))
+        sample = random.sample(range(first, last + 1), min(args.sample, args.users))
+        samples = []
+        started = time.perf_counter()
+        for user_id in sample:
+            query_started = time.perf_counter()
+            await escrow.get_period_totals(user_id, start_utc, end_utc)
+            samples.append(time.perf_counter() - query_started)
+        report("per-user", samples, time.perf_counter() - started)
+        print(f"per-user queries for all {args.users:,} subscribers: ~{statistics.mean(samples) * args.users:,.1f}s")
+
+        escrow.DIGEST_RATE = args.rate
+        bot = DigestBot(args.api_latency / 1000)
+        started = time.perf_counter()
+        counts = await escrow.send_daily_digest(bot, day)
+        elapsed = time.perf_counter() - started
+        print(f"digest run: {counts} in {elapsed:,.1f}s ({counts['sent'] / elapsed:,.1f} msg/s)")
+        if not set(range(first, last + 1)) <= bot.sent:
+            failures.append(f"{len(set(range(first, last + 1)) - bot.sent):,} subscribers got no digest")
+
+        escrow.DIGEST_MAX_SECONDS = args.users / args.rate / 4
+        started = time.perf_counter()
+        counts = await escrow.send_daily_digest(DigestBot(args.api_latency / 1000), day)
+        elapsed = time.perf_counter() - started
+        print(f"bounded run (DIGEST_MAX_SECONDS={escrow.DIGEST_MAX_SECONDS:,.1f}): {counts} in {elapsed:,.1f}s")
+        if not counts["skipped"] or elapsed > escrow.DIGEST_MAX_SECONDS + 5:
+            failures.append("the digest run did not stop at DIGEST_MAX_SECONDS")
+        if not args.keep:
+            await escrow.db_query("DELETE FROM user_daily_stats WHERE user_id BETWEEN %s AND %s", (first, last), fetch="none")
+            await escrow.db_query("DELETE FROM users WHERE user_id BETWEEN %s AND %s", (first, last), fetch="none")
+    finally:
+        await escrow.close_db_pool()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok: every subscriber got a digest and a capped run stopped on time")
+
+async def _served_by_replica(intent: str = "read") -> bool:
+    return (await escrow.db_query("SELECT pg_is_in_recovery()", fetch="one", intent=intent))[0]
+
+async def _writes_under_report_load(seconds: float, readers: int) -> tuple[list[float], float]:
+    """Times single-row writes while `readers` tasks loop over the global stats rebuild query."""
+    samples, stop = [], asyncio.Event()
+
+    async def reader():
+        while not stop.is_set():
+            await escrow.db_query(escrow.GLOBAL_COUNTERS_FROM_SOURCE_SQL, intent="read")
+
+    tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        write_started = time.perf_counter()
+        await escrow.db_query("UPDATE users SET last_seen = now() WHERE user_id = %s", (BENCH_USER_ID,), fetch="none")
+        samples.append(time.perf_counter() - write_started)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return samples, time.perf_counter() - started
+
+async def bench_replica(args):
+    """Checks read routing against a primary and a streaming standby, then compares write latency
+    under report load with reads on the replica vs all on the primary. Two local instances:
+
+        initdb -D /tmp/pg1 && pg_ctl -D /tmp/pg1 -o "-p 5432" -l /tmp/pg1.log start
+        pg_basebackup -p 5432 -D /tmp/pg2 -R && pg_ctl -D /tmp/pg2 -o "-p 5433" -l /tmp/pg2.log start
+    """
+    escrow.DATABASE_URL, escrow.DATABASE_REPLICA_URL = args.dsn, args.replica_dsn
+    await escrow.initialize_db_pool()
+    await seed_transactions(args.rows)
+    failures = []
+    try:
+        await escrow.replica_pool.wait(timeout=10)
+        await asyncio.sleep(1)  # let the seed replay
+        await escrow.replica_lag_job(None)
+        print(f"replica lag {escrow.replica_lag:.3f}s")
+        if not await _served_by_replica():
+            failures.append("a read went to the primary although the replica is caught up")
+        if await _served_by_replica("write"):
+            failures.append("a write-intent query went to the replica")
+        token = escrow._db_user.set(BENCH_USER_ID)
+        try:
+            await escrow.db_query("UPDATE users SET last_seen = now() WHERE user_id = %s", (BENCH_USER_ID,), fetch="none")
+            if await _served_by_replica():
+                failures.append("a read right after the same user's write went to the replica")
+        finally:
+            escrow._db_user.reset(token)
+        max_lag, escrow.REPLICA_MAX_LAG_SECONDS = escrow.REPLICA_MAX_LAG_SECONDS, -1
+        if await _served_by_replica():
+            failures.append("a read went to a replica over REPLICA_MAX_LAG_SECONDS")
+        escrow.REPLICA_MAX_LAG_SECONDS = max_lag
+
+        async def lag_monitor():
+            while True:
+                await asyncio.sleep(escrow.REPLICA_LAG_CHECK_INTERVAL)
+                await escrow.replica_lag_job(None)
+
+        monitor = asyncio.create_task(lag_monitor())
+        for name in ("primary", "replica"):
+            replica_pool = escrow.replica_pool
+            if name == "primary":
+                escrow.replica_pool = None
+            try:
+                samples, elapsed = await _writes_under_report_load(args.seconds, args.readers)
+            finally:
+                escrow.replica_pool = replica_pool
+            report(f"write:{name}", samples, elapsed)
+        monitor.cancel()
+        print(f"read routes: {dict(escrow.DB_READS.values)}")
+    finally:
+        await escrow.close_db_pool()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok: reads followed intent, read-your-writes and the lag threshold")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=BENCH_DATABASE_URL)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    db_parser = subparsers.add_parser("db", help="db_query p50/p99 latency: asyncio pool vs the old executor path")
+    db_parser.add_argument("--iterations", type=int, default=5000)
+    db_parser.add_argument("--concurrency", type=int, default=50)
+    db_parser.add_argument("--pool-size", type=int, default=20)
+    db_parser.add_argument("--rows", type=int, default=10000)
+    db_parser.set_defaults(func=bench_db)
+
+    parser_parser = subparsers.add_parser("parser", help="forwarded-deal parser microbenchmark")
+    parser_parser.add_argument("--iterations", type=int, default=50000)
+    parser_parser.set_defaults(func=bench_parser)
+
+    persistence_parser = subparsers.add_parser("persistence", help="flush/startup cost: pickle file vs bot_state rows")
+    persistence_parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000])
+    persistence_parser.add_argument("--touched", type=int, default=500)
+    persistence_parser.set_defaults(func=bench_persistence)
+
+    partitions_parser = subparsers.add_parser("partitions", help="plain vs monthly-partitioned transactions at scale")
+    partitions_parser.add_argument("--rows", type=int, default=10_000_000)
+    partitions_parser.add_argument("--months", type=int, default=24)
+    partitions_parser.add_argument("--users", type=int, default=50_000)
+    partitions_parser.add_argument("--iterations", type=int, default=2000)
+    partitions_parser.add_argument("--keep", action="store_true", help="leave the bench tables in place")
+    partitions_parser.set_defaults(func=bench_partitions)
+
+    outbound_parser = subparsers.add_parser("outbound", help="outbound scheduler: priorities, 429 retries and merging")
+    outbound_parser.add_argument("--background", type=int, default=300, help="background sends, one per chat")
+    outbound_parser.add_argument("--interactive", type=int, default=30)
+    outbound_parser.add_argument("--burst", type=int, default=50, help="texts queued for a single chat")
+    outbound_parser.add_argument("--flood-every", type=int, default=25)
+    outbound_parser.add_argument("--api-latency", type=float, default=30, help="fake Bot API response time in ms")
+    outbound_parser.set_defaults(func=bench_outbound)
+
+    sharding_parser = subparsers.add_parser("sharding", help="throughput of the front + worker processes layout by worker count")
+    sharding_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    sharding_parser.add_argument("--users", type=int, default=500)
+    sharding_parser.add_argument("--updates-per-user", type=int, default=40)
+    sharding_parser.add_argument("--work", type=int, default=20, help="parse+render repetitions per update")
+    sharding_parser.set_defaults(func=bench_sharding)
+
+    journal_parser = subparsers.add_parser("journal", help="deal journal fsync/ack latency and crash replay")
+    journal_parser.add_argument("--entries", type=int, default=5000)
+    journal_parser.add_argument("--concurrency", type=int, default=64)
+    journal_parser.set_defaults(func=bench_journal)
+
+    replica_parser = subparsers.add_parser("replica", help="read routing to a standby and write latency under report load")
+    replica_parser.add_argument("--replica-dsn", default=BENCH_REPLICA_DATABASE_URL)
+    replica_parser.add_argument("--rows", type=int, default=200000)
+    replica_parser.add_argument("--readers", type=int, default=8)
+    replica_parser.add_argument("--seconds", type=float, default=10)
+    replica_parser.set_defaults(func=bench_replica)
+
+    startup_parser = subparsers.add_parser("startup", help="boot time: versioned schema check vs DDL on every boot")
+    startup_parser.add_argument("--boots", type=int, default=20)
+    startup_parser.add_argument("--pool-size", type=int, default=4)
+    startup_parser.set_defaults(func=bench_startup)
+
+    digest_parser = subparsers.add_parser("digest", help="daily digest: grouped query vs per-user reports, run time at 100k users")
+    digest_parser.add_argument("--users", type=int, default=100_000)
+    digest_parser.add_argument("--sample", type=int, default=1000, help="users timed with the per-user report query")
+    digest_parser.add_argument("--rate", type=float, default=1000, help="DIGEST_RATE for the run")
+    digest_parser.add_argument("--api-latency", type=float, default=30, help="fake Bot API response time in ms")
+    digest_parser.add_argument("--first-user-id", type=int, default=8_000_000_000)
+    digest_parser.add_argument("--keep", action="store_true", help="leave the seeded subscribers in place")
+    digest_parser.set_defaults(func=bench_digest)
+
+
+    loadtest_parser = subparsers.add_parser("loadtest", help="end-to-end load test against a fake Bot API server")
+    loadtest_parser.add_argument("--transport", choices=["direct", "polling", "webhook"], default="direct")
+    loadtest_parser.add_argument("--users", type=int, default=200)
+    loadtest_parser.add_argument("--actions", type=int, default=50, help="actions per user")
+    loadtest_parser.add_argument("--think-ms", type=float, default=100, help="mean pause between a user's actions")
+    loadtest_parser.add_argument("--api-latency", type=float, default=30, help="fake Bot API response time in ms")
+    loadtest_parser.add_argument("--admin-interval", type=float, default=10, help="seconds between admin export+broadcast rounds")
+    loadtest_parser.add_argument("--first-user-id", type=int, default=9_000_000_000)
+    loadtest_parser.add_argument("--flood-limits", action="store_true", help="keep Telegram's outbound rate budgets")
+    loadtest_parser.add_argument("--output", default="loadtest.json")
+    loadtest_parser.set_defaults(func=bench_loadtest)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import itertools
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import escrow  # noqa: E402
+
+# DB-backed tests run against a scratch database and are skipped without one.
+TEST_DATABASE_URL = os.getenv("ESCROW_TEST_DATABASE_URL")
+
+SAMPLE_INR_DEAL = (
+    "🤝 Continue the Deal\n\n🆔 Trade ID: #TRX48213\n👤 Buyer : @buyer_handle\n👤 Seller : @seller_handle\n"
+    "Received Amount : ₹1,25,000.00\nEscrow Fee : ₹1,250.00\nRelease Amount : ₹1,23,750.00\n"
+    "Escrowed By : @escrow_desk_7\n\nPlease continue the deal once both parties confirm."
+)
+SAMPLE_CRYPTO_DEAL = (
+    "🤝 Continue the Deal\n\n🆔 Trade ID: #CRY90311\n👤 Buyer : @buyer_handle\n👤 Seller : @seller_handle\n"
+    "Received Amount : 2,450.75$\nNetwork : TRC20\nEscrowed By : @escrow_desk_2\n\n"
+    "Please continue the deal once both parties confirm."
+)
+
+# Users created by DB-backed tests get ids no real Telegram user has yet, unique across test files.
+_user_ids = itertools.count(int(datetime.now().timestamp()) * 100)
+
+
+def new_user():
+    user_id = next(_user_ids)
+    return SimpleNamespace(id=user_id, first_name="test", username=f"test{user_id}")
+
+
+def stand_in_update(user_id=7, text: str = ""):
+    """A real private-chat message Update from user_id, or one with neither user nor chat for None."""
+    if user_id is None:
+        return escrow.Update.de_json({"update_id": 1}, None)
+    return escrow.Update.de_json({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "test"}, "text": text,
+        },
+    }, None)
+
+
+@pytest.fixture
+def db_run():
+    """Runs an async test body with escrow's pool open on ESCROW_TEST_DATABASE_URL."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("set ESCROW_TEST_DATABASE_URL to a scratch Postgres database")
+
+    def run(main):
+        async def wrapper():
+            escrow.DATABASE_URL = TEST_DATABASE_URL
+            await escrow.initialize_db_pool()
+            try:
+                return await main()
+            finally:
+                await escrow.close_db_pool()
+        return asyncio.run(wrapper())
+
+    return run
+
+
+class RecordingBot:
+    """Stands in for telegram.Bot: records what would have been sent."""
+    rate_limiter = None
+
+    def __init__(self):
+        self.sent, self.edits = [], []
+
+    async def send_message(self, chat_id, text, parse_mode=None, **kwargs):
+        self.sent.append((chat_id, text))
+
+    async def edit_message_text(self, chat_id, message_id, text, parse_mode=None, **kwargs):
+        self.edits.append((chat_id, message_id, text))
+
+
+@pytest.fixture
+def bot():
+    return RecordingBot()
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = escrow.DealJournal(str(tmp_path / "deal_journal.jsonl"))
+    journal.open()
+    yield journal
+    journal._file.close()
@@ -0,0 +1,109 @@
+"""Bulk release: the age and counterparty shortcuts select the right deals, one press releases them
+all, and the dashboard that follows matches the database whether or not its snapshot went stale."""
+import re
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytz
+
+import escrow
+from conftest import new_user
+
+# (trade id suffix, days old, escrowed_by, received amount)
+DEALS = [("OLD1", 10, "@deskA", 100), ("OLD2", 9, "@deskB", 200), ("OLD3", 8, "@deskA", 300),
+         ("NEW1", 0, "@deskA", 400), ("NEW2", 0, "@deskC", 500)]
+
+
+class Chat:
+    """Stands in for one chat with the bot: the replies and edits the handlers make, and the
+    inline buttons on the bulk release panel."""
+
+    def __init__(self, user_id: int):
+        self.user = SimpleNamespace(id=user_id)
+        self.replies, self.edits, self.buttons = [], [], {}
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        self.replies.append(text)
+        self._keep_buttons(reply_markup)
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        self.edits.append(text)
+        self._keep_buttons(reply_markup)
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    def _keep_buttons(self, reply_markup):
+        if isinstance(reply_markup, escrow.InlineKeyboardMarkup):
+            self.buttons = {b.text: b.callback_data for row in reply_markup.inline_keyboard for b in row}
+
+    def message(self) -> SimpleNamespace:
+        return SimpleNamespace(message=self, effective_message=self, effective_user=self.user, callback_query=None)
+
+    def press(self, label: str) -> SimpleNamespace:
+        data = next(data for text, data in self.buttons.items() if text.startswith(label))
+        query = SimpleNamespace(data=data, from_user=self.user, answer=self.answer, edit_message_text=self.edit_message_text)
+        return SimpleNamespace(callback_query=query, effective_message=self, effective_user=self.user)
+
+
+async def insert_deals(user_id: int, prefix: str):
+    now = datetime.now(pytz.utc)
+    await escrow.db_query("INSERT INTO users (user_id, first_name) VALUES (%s, 'test')", (user_id,), fetch="none")
+    await escrow.db_query(
+        "SELECT ensure_transaction_partitions(%s::timestamptz, %s::timestamptz)", (now - timedelta(days=10), now), fetch="none"
+    )
+    for suffix, days, escrowed_by, amount in DEALS:
+        await escrow.db_query(
+            "INSERT INTO transactions (user_id, currency, received_amount, fee, trade_id, status, received_date, escrowed_by) "
+            "VALUES (%s, 'inr', %s, 1, %s, 'holding', %s, %s)",
+            (user_id, amount, f"#{prefix}{suffix}", now - timedelta(days=days, minutes=1), escrowed_by), fetch="none"
+        )
+
+
+async def holding(user_id: int) -> set[str]:
+    rows = await escrow.db_query("SELECT trade_id FROM transactions WHERE user_id=%s AND status='holding'", (user_id,))
+    return {trade_id for (trade_id,) in rows}
+
+
+def run_bulk_release(db_run, presses, released_elsewhere=()):
+    """Opens the INR dashboard and the bulk release panel, presses `presses` and then Release."""
+    user = new_user()
+    prefix = f"B{user.id % 100000}"
+    chat = Chat(user.id)
+    context = SimpleNamespace(user_data={'original_user_id': user.id})
+
+    async def main():
+        await insert_deals(user.id, prefix)
+        try:
+            await escrow.show_inr_dashboard(chat.message(), context)
+            await escrow.show_bulk_release_inr(chat.message(), context)
+            for label in presses:
+                await escrow.bulk_release_callback(chat.press(label), context)
+            if released_elsewhere:
+                await escrow.release_deals(user.id, [f"#{prefix}{suffix}" for suffix in released_elsewhere])
+            await escrow.bulk_release_callback(chat.press("✅ Release"), context)
+            return await holding(user.id)
+        finally:
+            await escrow.db_query("DELETE FROM users WHERE user_id = %s", (user.id,), fetch="none")
+
+    left = db_run(main)
+    return {trade_id[len(prefix) + 1:] for trade_id in left}, chat
+
+
+def dashboard_holding(chat: Chat) -> str:
+    return re.search(r"Holding:\*\* ₹([\d,.]+)", chat.replies[-1]).group(1)
+
+
+def test_age_and_counterparty_shortcuts_release_their_deals(db_run):
+    left, chat = run_bulk_release(db_run, ["⏳ Older than 7d", "👤 All by @deskA"])
+    assert left == {"NEW2"}
+    assert "4 deal(s), ₹1,000.00 in total" in chat.edits[-1]
+    assert dashboard_holding(chat) == "500.00"
+
+
+def test_deals_released_elsewhere_are_reported_and_the_dashboard_reloaded(db_run):
+    left, chat = run_bulk_release(db_run, ["⏳ Older than 7d"], released_elsewhere=["OLD1", "NEW1"])
+    assert left == {"NEW2"}
+    assert "2 deal(s), ₹500.00 in total" in chat.edits[-1]
+    assert "1 selected deal(s) were already completed" in chat.edits[-1]
+    assert dashboard_holding(chat) == "500.00"
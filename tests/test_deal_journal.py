@@ -0,0 +1,190 @@
+"""DealJournal draining: bad entries are rejected instead of blocking the batch, and each entry is
+confirmed on its own result."""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytz
+
+import escrow
+from conftest import new_user
+
+# A month no partition maintenance run has reached yet.
+FUTURE_MONTH, FUTURE_AT = "2040_06", "2040-06-15T00:00:00+00:00"
+
+
+def deal(user, trade_id: str, **fields) -> dict:
+    entry = escrow.journal_entry(
+        "deal", user, user.id, trade_id, currency="inr", received_amount=1000.0, fee=10.0, escrowed_by="@desk"
+    )
+    entry.update(fields)
+    return entry
+
+
+async def saved_trade_ids(user_id: int) -> set[str]:
+    rows = await escrow.db_query("SELECT trade_id FROM transactions WHERE user_id = %s", (user_id,))
+    return {trade_id for (trade_id,) in rows}
+
+
+async def delete_user(user_id: int):
+    await escrow.db_query("DELETE FROM users WHERE user_id = %s", (user_id,), fetch="none")
+
+
+def test_unapplicable_entry_is_rejected_and_the_rest_applied(db_run, journal, bot):
+    user = new_user()
+
+    async def main():
+        # REAL cannot hold this amount, so the database refuses this one entry.
+        entries = [deal(user, "#OK1"), deal(user, "#BAD", received_amount=1e39), deal(user, "#OK2")]
+        for entry in entries:
+            await journal.append(entry)
+        try:
+            assert await journal.drain(bot) == 3
+            return await saved_trade_ids(user.id)
+        finally:
+            await delete_user(user.id)
+
+    assert db_run(main) == {"#OK1", "#OK2"}
+    assert journal.pending == []
+    assert os.path.getsize(journal.path) == 0
+    with open(journal.rejects_path) as f:
+        rejects = [json.loads(line) for line in f]
+    assert [r["trade_id"] for r in rejects] == ["#BAD"]
+    assert rejects[0]["error"]
+    to_user = [text for chat_id, text in bot.sent if chat_id == user.id]
+    assert any("#BAD" in text and "Could not save" in text for text in to_user)
+    assert any("#OK1" in text and "#OK2" in text for text in to_user)
+    assert any(chat_id == escrow.BOT_OWNER_ID and "#BAD" in text for chat_id, text in bot.sent)
+
+
+def test_entry_dated_into_a_missing_partition_is_applied_not_rejected(db_run, journal, bot):
+    user = new_user()
+
+    async def main():
+        await escrow.db_query(f"DROP TABLE IF EXISTS transactions_{FUTURE_MONTH}", fetch="none")
+        for entry in [deal(user, "#NOW"), deal(user, "#AHEAD", at=FUTURE_AT)]:
+            await journal.append(entry)
+        try:
+            assert await journal.drain(bot) == 2
+            return await saved_trade_ids(user.id)
+        finally:
+            await delete_user(user.id)
+            await escrow.db_query(f"DROP TABLE IF EXISTS transactions_{FUTURE_MONTH}", fetch="none")
+
+    assert db_run(main) == {"#NOW", "#AHEAD"}
+    assert not os.path.exists(journal.rejects_path)
+
+
+def test_owner_is_alerted_once_when_the_oldest_entry_is_too_old(journal, bot):
+    user = new_user()
+    stale = (datetime.now(pytz.utc) - timedelta(seconds=escrow.DEAL_JOURNAL_ALERT_AGE + 60)).isoformat()
+    journal.pending.append(deal(user, "#OLD", at=stale))
+
+    async def main():
+        await journal._alert_if_stuck(bot, RuntimeError("connection refused"))
+        await journal._alert_if_stuck(bot, RuntimeError("connection refused"))
+
+    asyncio.run(main())
+    assert journal.oldest_age() > escrow.DEAL_JOURNAL_ALERT_AGE
+    assert [chat_id for chat_id, _ in bot.sent] == [escrow.BOT_OWNER_ID]
+
+
+def test_repeated_trade_in_one_batch_is_confirmed_once(db_run, journal, bot):
+    user = new_user()
+
+    async def main():
+        # Two fee picks for the same crypto deal, then two completion forwards for it.
+        for message_id in (1, 2):
+            await journal.append(deal(user, "#CRY1", currency="crypto", edit_message_id=message_id))
+        for _ in range(2):
+            await journal.append(escrow.journal_entry("complete", user, user.id, "#CRY1"))
+        try:
+            await journal.drain(bot)
+        finally:
+            await delete_user(user.id)
+
+    db_run(main)
+    edits = {message_id: text for _, message_id, text in bot.edits}
+    assert "New CRYPTO Escrow Added" in edits[1]
+    assert "Duplicate" in edits[2]
+    completions = [text for _, text in bot.sent]
+    assert len(completions) == 2
+    assert "Deal Completed" in completions[0]
+    assert "Not Found" in completions[1]
+
+
+def test_applied_users_read_from_the_primary(db_run, journal, bot, monkeypatch):
+    user = new_user()
+    # A caught-up replica: without a recent write, a read-intent query would be sent to it.
+    monkeypatch.setattr(escrow, "replica_lag", 0.0)
+    monkeypatch.setattr(escrow, "_recent_writers", {})
+
+    async def main():
+        await journal.append(deal(user, "#RYW1"))
+        monkeypatch.setattr(escrow, "replica_checked_at", escrow.time.monotonic())
+        token = escrow._db_user.set(user.id)
+        escrow.replica_pool = object()  # only checked for presence by the routing
+        try:
+            assert escrow.route_to_replica("read")
+            await journal.drain(bot)
+            return escrow.route_to_replica("read")
+        finally:
+            escrow.replica_pool = None
+            escrow._db_user.reset(token)
+            await delete_user(user.id)
+
+    assert db_run(main) is False
+
+
+def test_forwards_are_acknowledged_once_per_chat_when_on_disk(journal, bot):
+    user, other = new_user(), new_user()
+    journal._bot = bot
+
+    async def main():
+        await asyncio.gather(
+            journal.append(deal(user, "#ACK1")),
+            journal.append(deal(user, "#ACK2")),
+            journal.append(escrow.journal_entry("complete", user, user.id, "#ACK0")),
+            journal.append(deal(other, "#ACK3")),
+            journal.append(deal(other, "#ACK4", currency="crypto", edit_message_id=9)),
+        )
+
+    asyncio.run(main())
+    assert len(journal.pending) == 5
+    assert sorted(bot.sent) == sorted([
+        (user.id, "📥 Received `#ACK1`, `#ACK2`, `#ACK0`, saving..."),
+        (other.id, "📥 Received `#ACK3`, saving..."),
+    ])
+
+
+def write_journal(path, entries):
+    with open(path, "w") as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in entries)
+
+
+def test_journals_of_workers_that_are_gone_are_orphaned(tmp_path, monkeypatch):
+    base = tmp_path / "deal_journal.jsonl"
+    monkeypatch.setattr(escrow, "DEAL_JOURNAL_PATH", str(base))
+    monkeypatch.setattr(escrow, "WORKERS", 2)
+    for suffix in ("", ".0", ".1", ".2", ".3", ".3.rejects", ".rejects"):
+        write_journal(f"{base}{suffix}", [])
+    assert escrow.orphaned_journal_paths() == [f"{base}.0", f"{base}.2", f"{base}.3"]
+
+
+def test_orphaned_journal_is_replayed_and_removed(db_run, tmp_path, bot, monkeypatch):
+    user = new_user()
+    base = tmp_path / "deal_journal.jsonl"
+    monkeypatch.setattr(escrow, "DEAL_JOURNAL_PATH", str(base))
+    monkeypatch.setattr(escrow, "WORKERS", 1)
+    write_journal(f"{base}.3", [deal(user, "#ORPHAN")])
+
+    async def main():
+        try:
+            await escrow.replay_orphaned_journals(bot)
+            return await saved_trade_ids(user.id)
+        finally:
+            await delete_user(user.id)
+
+    assert db_run(main) == {"#ORPHAN"}
+    assert not os.path.exists(f"{base}.3")
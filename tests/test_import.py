@@ -0,0 +1,60 @@
+"""Bulk import: a JSON array is decoded element by element, and rows whose amounts overflow REAL or
+whose trade_id the user already has are rejected one by one instead of failing the whole file."""
+import json
+from datetime import datetime
+
+import pytz
+
+import escrow
+from conftest import new_user
+
+
+def row(user_id: int, trade_id: str, **fields) -> dict:
+    record = {"user_id": user_id, "currency": "inr", "trade_id": trade_id, "received_amount": "100", "fee": "1",
+              "status": "completed", "received_date_utc": datetime.now(pytz.utc).isoformat()}
+    record.update(fields)
+    return record
+
+
+def test_json_array_import_rejects_bad_rows_individually(db_run, tmp_path, monkeypatch):
+    # Small chunks, so elements and numbers are split across reads.
+    monkeypatch.setattr(escrow, "IMPORT_CHUNK_SIZE", 16)
+    user = new_user()
+    rows = [
+        row(user.id, "#IMP1"),
+        row(user.id, "#IMP2", received_amount="1e39"),
+        row(user.id, "#IMP3", fee="1e-50"),
+        row(user.id, "#IMP4", received_amount="3e38", fee="-3e38"),
+        row(user.id, "#IMP5", release_amount="12345678901234567890123456789012345678901"),
+        row(user.id, "#EXISTING"),
+        row(user.id, "#IMP6", received_amount="250.5", fee="2.5"),
+    ]
+    path = tmp_path / "deals.json"
+    path.write_text(json.dumps(rows, indent=1))
+
+    async def main():
+        await escrow.db_query("INSERT INTO users (user_id) VALUES (%s)", (user.id,), fetch="none")
+        try:
+            await escrow.db_query(
+                "INSERT INTO transactions (user_id, currency, received_amount, fee, trade_id, status, received_date) "
+                "VALUES (%s, 'inr', 1, 0, '#EXISTING', 'completed', now())", (user.id,), fetch="none"
+            )
+            result = await escrow.import_deals_file(str(path), "deals.json")
+            saved = await escrow.db_query(
+                "SELECT trade_id, received_amount, release_amount FROM transactions WHERE user_id = %s AND trade_id LIKE '#IMP%%' ORDER BY trade_id",
+                (user.id,)
+            )
+            return result, saved
+        finally:
+            await escrow.db_query("DELETE FROM users WHERE user_id = %s", (user.id,), fetch="none")
+
+    (total, imported, rejects), saved = db_run(main)
+    assert (total, imported) == (7, 2)
+    assert rejects == [
+        (2, "received_amount out of range"),
+        (3, "fee out of range"),
+        (4, "received_amount - fee out of range"),
+        (5, "release_amount out of range"),
+        (6, "trade_id already exists for this user"),
+    ]
+    assert saved == [("#IMP1", 100.0, 99.0), ("#IMP6", 250.5, 248.0)]
@@ -0,0 +1,61 @@
+"""migrate_schema: pending migrations run in version order, each is recorded as it completes, and a
+run that fails part-way resumes from the failed migration on the next start."""
+import pytest
+
+import escrow
+
+# Well above any real schema version; removed from schema_version again afterwards.
+BASE = 1000
+
+
+def test_failed_migration_is_resumed_in_order(db_run, monkeypatch):
+    ran, fail = [], {BASE + 3}
+
+    def step(version: int):
+        async def apply(conn):
+            ran.append(version)
+            await conn.execute(f"CREATE TABLE migration_test_{version} ()", prepare=False)
+            if version in fail:
+                raise RuntimeError(f"migration {version} failed")
+        return apply
+
+    async def applied_versions():
+        rows = await escrow.db_query("SELECT version FROM schema_version WHERE version > %s ORDER BY version", (BASE,))
+        return [version for (version,) in rows]
+
+    async def table_exists(version: int) -> bool:
+        row = await escrow.db_query("SELECT to_regclass(%s) IS NOT NULL", (f"migration_test_{version}",), fetch="one")
+        return row[0]
+
+    async def main():
+        monkeypatch.setattr(escrow, "MIGRATIONS", escrow.MIGRATIONS + [
+            escrow.Migration(BASE + 1, "first", step(BASE + 1)),
+            escrow.Migration(BASE + 2, "second", step(BASE + 2), transactional=False),
+            escrow.Migration(BASE + 3, "third", step(BASE + 3)),
+            escrow.Migration(BASE + 4, "fourth", step(BASE + 4)),
+        ])
+        try:
+            async with escrow.db_pool.connection() as conn:
+                with pytest.raises(RuntimeError, match="migration 1003 failed"):
+                    await escrow.migrate_schema(conn)
+            after_failure = await applied_versions(), await table_exists(BASE + 3)
+            async with escrow.db_pool.connection() as conn:
+                # Another session can take the lock, so the failed run released it.
+                cur = await conn.execute("SELECT pg_try_advisory_lock(%s)", (escrow.MIGRATION_LOCK_ID,), prepare=False)
+                assert (await cur.fetchone())[0]
+                await conn.execute("SELECT pg_advisory_unlock(%s)", (escrow.MIGRATION_LOCK_ID,), prepare=False)
+            fail.clear()
+            async with escrow.db_pool.connection() as conn:
+                resumed = await escrow.migrate_schema(conn)
+            return after_failure, resumed, await applied_versions()
+        finally:
+            await escrow.db_query("DELETE FROM schema_version WHERE version > %s", (BASE,), fetch="none")
+            for version in range(BASE + 1, BASE + 5):
+                await escrow.db_query(f"DROP TABLE IF EXISTS migration_test_{version}", fetch="none")
+
+    (versions_after_failure, failed_table_kept), resumed, versions = db_run(main)
+    assert versions_after_failure == [BASE + 1, BASE + 2]
+    assert not failed_table_kept  # rolled back with its transaction
+    assert resumed == [BASE + 3, BASE + 4]
+    assert versions == [BASE + 1, BASE + 2, BASE + 3, BASE + 4]
+    assert ran == [BASE + 1, BASE + 2, BASE + 3, BASE + 3, BASE + 4]
@@ -0,0 +1,40 @@
+"""parse_deal_message: realistic INR and crypto forwards parse into DealRecords, and forwards missing
+a field raise DealParseError with the message the user is shown."""
+import pytest
+
+import escrow
+from conftest import SAMPLE_CRYPTO_DEAL, SAMPLE_INR_DEAL
+
+
+def test_inr_deal():
+    assert escrow.parse_deal_message(SAMPLE_INR_DEAL) == escrow.DealRecord(
+        "#TRX48213", "@escrow_desk_7", "inr", 125000.0, 1250.0
+    )
+
+
+def test_crypto_deal():
+    assert escrow.parse_deal_message(SAMPLE_CRYPTO_DEAL) == escrow.DealRecord(
+        "#CRY90311", "@escrow_desk_2", "crypto", 2450.75
+    )
+
+
+def test_escrowed_by_at_end_of_message_and_whole_amounts():
+    msg = "Trade ID: #T1\nReceived Amount : ₹500\nEscrow Fee : ₹5\nEscrowed By : @desk  "
+    assert escrow.parse_deal_message(msg) == escrow.DealRecord("#T1", "@desk", "inr", 500.0, 5.0)
+
+
+def test_first_occurrence_of_a_field_wins():
+    msg = SAMPLE_CRYPTO_DEAL + "\nTrade ID: #LATER\nReceived Amount : 1$"
+    record = escrow.parse_deal_message(msg)
+    assert (record.trade_id, record.received_amount) == ("#CRY90311", 2450.75)
+
+
+@pytest.mark.parametrize("msg, error", [
+    (SAMPLE_INR_DEAL.replace("Trade ID", "Trade"), "`Trade ID` and `Escrowed By`"),
+    (SAMPLE_CRYPTO_DEAL.replace("Escrowed By", "By"), "`Trade ID` and `Escrowed By`"),
+    (SAMPLE_INR_DEAL.replace("Escrow Fee", "Fee"), "INR `Received Amount` and `Escrow Fee`"),
+    (SAMPLE_CRYPTO_DEAL.replace("2,450.75$", "2,450.75 USDT"), "Crypto `Received Amount`"),
+])
+def test_missing_field(msg, error):
+    with pytest.raises(escrow.DealParseError, match=error):
+        escrow.parse_deal_message(msg)
@@ -0,0 +1,101 @@
+"""Archiving monthly partitions never leaves a month outside both `transactions` and
+`transactions_cold`, and archived months are not recreated or imported into."""
+import csv
+
+import escrow
+
+# Months far enough back to be archived and far enough from real data to be dropped afterwards.
+ARCHIVED, NAME_TAKEN, RANGE_TAKEN = "2001_01", "2001_02", "2001_03"
+FUTURE = "2030_01"
+TEST_TABLES = [f"transactions_{m}" for m in (ARCHIVED, NAME_TAKEN, RANGE_TAKEN, FUTURE)] + \
+              [f"transactions_cold_{m}" for m in (ARCHIVED, NAME_TAKEN, RANGE_TAKEN)] + ["transactions_cold_test_overlap"]
+
+
+async def parent_of(name: str):
+    rows = await escrow.db_query(
+        "SELECT i.inhparent::regclass::text FROM pg_inherits i WHERE i.inhrelid = to_regclass(%s)", (name,)
+    )
+    return rows[0][0] if rows else None
+
+
+async def create_month(suffix: str):
+    start, end = escrow._month_bounds(suffix)
+    await escrow.db_query(
+        f"SELECT ensure_transaction_partitions({start}::timestamptz, {start}::timestamptz)", fetch="none"
+    )
+    return start, end
+
+
+async def drop_test_tables():
+    for name in TEST_TABLES:
+        await escrow.db_query(f"DROP TABLE IF EXISTS {name}", fetch="none")
+
+
+def run_archive(db_run, scenario):
+    async def main():
+        await drop_test_tables()
+        try:
+            return await scenario()
+        finally:
+            await drop_test_tables()
+    return db_run(main)
+
+
+def test_archived_month_is_not_recreated_or_imported_into(db_run, tmp_path):
+    path = tmp_path / "deals.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(escrow.EXPORT_COLUMNS)
+        row = dict.fromkeys(escrow.EXPORT_COLUMNS, "")
+        row.update(user_id="1", currency="inr", trade_id="#OLD", received_amount="100", fee="1",
+                   status="completed", received_date_utc="2001-01-15T00:00:00+00:00")
+        writer.writerow([row[column] for column in escrow.EXPORT_COLUMNS])
+
+    async def scenario():
+        start, _ = await create_month(ARCHIVED)
+        assert ARCHIVED in await escrow.archive_transaction_partitions()
+        assert await parent_of(f"transactions_cold_{ARCHIVED}") == "transactions_cold"
+        await create_month(ARCHIVED)
+        assert await parent_of(f"transactions_{ARCHIVED}") is None
+        _, imported, rejects = await escrow.import_deals_file(str(path), "deals.csv")
+        assert imported == 0
+        assert rejects == [(1, "received_date_utc is in an archived month")]
+
+    run_archive(db_run, scenario)
+
+
+def test_month_already_in_cold_storage_is_left_attached(db_run):
+    async def scenario():
+        start, end = await create_month(NAME_TAKEN)
+        await escrow.db_query(
+            f"CREATE TABLE transactions_cold_{NAME_TAKEN} PARTITION OF transactions_cold FOR VALUES FROM ({start}) TO ({end})",
+            fetch="none"
+        )
+        assert NAME_TAKEN not in await escrow.archive_transaction_partitions()
+        assert await parent_of(f"transactions_{NAME_TAKEN}") == "transactions"
+
+    run_archive(db_run, scenario)
+
+
+def test_failed_attach_puts_the_month_back(db_run):
+    async def scenario():
+        start, end = await create_month(RANGE_TAKEN)
+        # An empty cold partition over the same range under another name: only ATTACH notices it.
+        await escrow.db_query(
+            f"CREATE TABLE transactions_cold_test_overlap PARTITION OF transactions_cold FOR VALUES FROM ({start}) TO ({end})",
+            fetch="none"
+        )
+        assert RANGE_TAKEN not in await escrow.archive_transaction_partitions()
+        assert await parent_of(f"transactions_{RANGE_TAKEN}") == "transactions"
+
+    run_archive(db_run, scenario)
+
+
+def test_orphaned_month_is_reattached(db_run):
+    async def scenario():
+        await create_month(FUTURE)
+        await escrow.db_query(f"ALTER TABLE transactions DETACH PARTITION transactions_{FUTURE}", fetch="none")
+        await escrow.archive_transaction_partitions()
+        assert await parent_of(f"transactions_{FUTURE}") == "transactions"
+
+    run_archive(db_run, scenario)
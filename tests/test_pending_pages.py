@@ -0,0 +1,73 @@
+"""Pending deal pages: following Next and then Prev through the keyset cursor visits every holding
+deal once, in (received_date, id) order, including deals that share a received_date."""
+import re
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytz
+
+import escrow
+from conftest import new_user
+
+PAGE_SIZE = 3  # odd, so page boundaries split pairs of deals that share a received_date
+DEALS = 10
+
+
+class PageView:
+    """Stands in for the message a pending page is shown in: remembers its text and buttons."""
+
+    def __init__(self, user_id: int):
+        self.user = SimpleNamespace(id=user_id)
+        self.text, self.buttons = None, {}
+
+    async def show(self, text, reply_markup=None, **kwargs):
+        self.text = text
+        self.buttons = {button.text: button.callback_data for row in reply_markup.inline_keyboard for button in row}
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    def press(self, label: str) -> SimpleNamespace:
+        query = SimpleNamespace(data=self.buttons[label], from_user=self.user, answer=self.answer, edit_message_text=self.show)
+        return SimpleNamespace(callback_query=query, effective_user=self.user)
+
+    def trade_ids(self) -> list[str]:
+        return re.findall(r"\*\*ID\*\*: `([^`]+)`", self.text)
+
+
+def test_next_and_prev_visit_every_deal_once_in_order(db_run, monkeypatch):
+    monkeypatch.setattr(escrow, "PENDING_PAGE_SIZE", PAGE_SIZE)
+    user = new_user()
+    # Pairs of deals share a received_date, so pages have to be told apart by id as well.
+    start = datetime.now(pytz.utc).replace(microsecond=0) - timedelta(hours=DEALS)
+    dates = [start + timedelta(hours=n // 2) for n in range(DEALS)]
+    view = PageView(user.id)
+    context = SimpleNamespace(user_data={'original_user_id': user.id})
+
+    async def main():
+        await escrow.db_query("INSERT INTO users (user_id, first_name) VALUES (%s, 'test')", (user.id,), fetch="none")
+        try:
+            for n, received_date in enumerate(dates):
+                await escrow.db_query(
+                    "INSERT INTO transactions (user_id, currency, received_amount, fee, release_amount, trade_id, status, received_date) "
+                    "VALUES (%s, 'inr', 100, 1, 99, %s, 'holding', %s)",
+                    (user.id, f"#PG{n}", received_date), fetch="none"
+                )
+            await escrow.send_pending_page(SimpleNamespace(callback_query=SimpleNamespace(edit_message_text=view.show)), context, "u")
+            forward = [view.trade_ids()]
+            while "Next ▶️" in view.buttons:
+                await escrow.navigate_pending_page(view.press("Next ▶️"), context)
+                forward.append(view.trade_ids())
+            backward = [view.trade_ids()]
+            while "◀️ Prev" in view.buttons:
+                await escrow.navigate_pending_page(view.press("◀️ Prev"), context)
+                backward.append(view.trade_ids())
+            return forward, backward, view.text
+        finally:
+            await escrow.db_query("DELETE FROM users WHERE user_id = %s", (user.id,), fetch="none")
+
+    forward, backward, first_page = db_run(main)
+    everything = [f"#PG{n}" for n in range(DEALS)]
+    assert forward == [everything[i:i + PAGE_SIZE] for i in range(0, DEALS, PAGE_SIZE)]
+    assert backward == forward[::-1]
+    assert f"PENDING RELEASES ({DEALS})" in first_page
@@ -0,0 +1,59 @@
+"""get_period_totals: whole IST days read from user_daily_stats plus the partial days at the edges
+add up to exactly what a scan of `transactions` over the same range gives."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import escrow
+from conftest import new_user
+
+# IST midnight ten days ago; every deal and range below is an offset in hours from it.
+BASE = escrow.ist_midnight_utc((datetime.now(escrow.IST) - timedelta(days=10)).date())
+DEAL_HOURS = [-1, 0, 5, 6, 7, 25, 60, 81, 82, 83, 96]
+
+
+def at(hours: float) -> datetime:
+    return BASE + timedelta(hours=hours)
+
+
+async def insert_deals(user_id: int):
+    await escrow.db_query("INSERT INTO users (user_id) VALUES (%s)", (user_id,), fetch="none")
+    await escrow.db_query(
+        "SELECT ensure_transaction_partitions(%s::timestamptz, %s::timestamptz)", (at(-1), at(96)), fetch="none"
+    )
+    for n, hours in enumerate(DEAL_HOURS):
+        await escrow.db_query(
+            "INSERT INTO transactions (user_id, currency, received_amount, fee, trade_id, status, received_date) "
+            "VALUES (%s, %s, %s, %s, %s, 'completed', %s)",
+            (user_id, "inr" if n % 3 else "crypto", 100 + n, 1 + n, f"#PT{n}", at(hours)), fetch="none"
+        )
+
+
+def expected(start: float, end: float) -> dict:
+    totals = {}
+    for n, hours in enumerate(DEAL_HOURS):
+        if start <= hours <= end:
+            fees, volume = totals.get("inr" if n % 3 else "crypto", (0, 0))
+            totals["inr" if n % 3 else "crypto"] = (fees + 1 + n, volume + 100 + n)
+    return totals
+
+
+@pytest.mark.parametrize("start, end", [
+    (6, 82),   # partial days at both edges, whole days between
+    (0, 82),   # starts exactly at IST midnight, so the first day is whole
+    (6, 96),   # ends exactly at IST midnight
+    (5, 7),    # within one day: a plain scan
+    (0, 24),   # one whole day and the first instant of the next
+])
+def test_period_totals_match_a_transactions_scan(db_run, start, end):
+    user = new_user()
+
+    async def main():
+        await insert_deals(user.id)
+        try:
+            rows = await escrow.get_period_totals(user.id, at(start), at(end))
+        finally:
+            await escrow.db_query("DELETE FROM users WHERE user_id = %s", (user.id,), fetch="none")
+        return {currency: (float(fees), float(volume)) for currency, fees, volume in rows}
+
+    assert db_run(main) == expected(start, end)
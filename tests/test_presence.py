@@ -0,0 +1,48 @@
+"""Presence buffer: known users are kept in an LRU of KNOWN_USERS_CACHE_SIZE, and a last_seen bump
+buffered for a user who is evicted before the flush is still written."""
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+import escrow
+from conftest import new_user, stand_in_update
+
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    monkeypatch.setattr(escrow, "KNOWN_USERS_CACHE_SIZE", 2)
+    monkeypatch.setattr(escrow, "_known_users", OrderedDict())
+    monkeypatch.setattr(escrow, "_pending_last_seen", {})
+
+
+def test_least_recently_seen_user_is_evicted(small_cache):
+    escrow.remember_known_user(1, "test", None)
+    escrow.remember_known_user(2, "test", None)
+    # Known, so this only buffers a bump, and marks user 1 as recently seen.
+    asyncio.run(escrow.register_user(stand_in_update(1)))
+    escrow.remember_known_user(3, "test", None)
+    assert list(escrow._known_users) == [1, 3]
+    assert list(escrow._pending_last_seen) == [1]
+
+
+def test_bump_of_an_evicted_user_is_flushed(db_run, small_cache):
+    user = new_user()
+
+    async def main():
+        await escrow.db_query("INSERT INTO users (user_id, first_name, last_seen) VALUES (%s, 'test', '2001-01-01')", (user.id,), fetch="none")
+        try:
+            escrow.remember_known_user(user.id, "test", None)
+            await escrow.register_user(stand_in_update(user.id))
+            escrow.remember_known_user(user.id + 1, "test", None)
+            escrow.remember_known_user(user.id + 2, "test", None)
+            assert user.id not in escrow._known_users
+            bumped = escrow._pending_last_seen[user.id][2]
+            await escrow.flush_presence()
+            row = await escrow.db_query("SELECT last_seen FROM users WHERE user_id = %s", (user.id,), fetch="one")
+        finally:
+            await escrow.db_query("DELETE FROM users WHERE user_id = %s", (user.id,), fetch="none")
+        return bumped, row[0]
+
+    bumped, last_seen = db_run(main)
+    assert last_seen == bumped
@@ -0,0 +1,64 @@
+"""global_counters: concurrent deal writes add to different slots of a counter, reads sum them, and
+drift from the source tables is reported, then repaired only by a rebuild."""
+import asyncio
+
+import escrow
+from conftest import new_user
+
+
+async def counters() -> dict:
+    rows = await escrow.db_query("SELECT name, SUM(value) FROM global_counters GROUP BY name")
+    return dict(rows)
+
+
+async def insert_deal(user_id: int, trade_id: str):
+    async with escrow.db_connection() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "INSERT INTO transactions (user_id, currency, received_amount, fee, trade_id, status, received_date) "
+                "VALUES (%s, 'inr', 100, 1, %s, 'holding', now())",
+                (user_id, trade_id)
+            )
+
+
+def test_concurrent_deals_spread_over_counter_slots(db_run):
+    user_id = new_user().id
+
+    async def main():
+        before = await counters()
+        await escrow.db_query("INSERT INTO users (user_id) VALUES (%s)", (user_id,), fetch="none")
+        try:
+            await asyncio.gather(*(insert_deal(user_id, f"#SLOT{n}") for n in range(20)))
+            after = await counters()
+            slots = await escrow.db_query("SELECT COUNT(*) FROM global_counters WHERE name = 'pending'", fetch="one")
+        finally:
+            await escrow.db_query("DELETE FROM users WHERE user_id = %s", (user_id,), fetch="none")
+        return before, after, slots[0], await counters()
+
+    before, after, slots, cleaned = db_run(main)
+    assert after["pending"] - before["pending"] == 20
+    assert after["holding:inr"] - before["holding:inr"] == 2000
+    assert after["fees:inr"] - before["fees:inr"] == 20
+    assert after["users"] - before["users"] == 1
+    assert slots > 1
+    assert cleaned["pending"] == before["pending"]
+
+
+def test_counter_drift_is_reported_and_only_rebuilt_on_request(db_run):
+    async def main():
+        await escrow.find_balance_drift(rebuild=True)
+        await escrow.db_query(
+            "INSERT INTO global_counters (name, slot, value) VALUES ('pending', 3, 5) "
+            "ON CONFLICT (name, slot) DO UPDATE SET value = global_counters.value + 5", fetch="none"
+        )
+        _, _, verified = await escrow.find_balance_drift()
+        _, _, still_there = await escrow.find_balance_drift()
+        _, _, rebuilt = await escrow.find_balance_drift(rebuild=True)
+        _, _, after = await escrow.find_balance_drift()
+        return verified, still_there, rebuilt, after
+
+    verified, still_there, rebuilt, after = db_run(main)
+    assert [(name, stored - real) for name, stored, real in verified] == [("pending", 5)]
+    assert still_there == verified
+    assert rebuilt == verified
+    assert after == []
@@ -0,0 +1,92 @@
+"""HANDLER_ROUNDTRIP_BUDGETS: the deal-ingestion handlers stay within their budgets, and statements
+run by tasks a handler spawns count against it."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import escrow
+from conftest import SAMPLE_CRYPTO_DEAL, SAMPLE_INR_DEAL
+
+
+USER_ID = 4242
+
+
+async def noop(*args, **kwargs):
+    return SimpleNamespace(message_id=1)
+
+
+def message_update(text: str) -> SimpleNamespace:
+    user = SimpleNamespace(id=USER_ID, first_name="test", username="test")
+    return SimpleNamespace(
+        effective_user=user, effective_chat=SimpleNamespace(id=USER_ID), callback_query=None,
+        message=SimpleNamespace(text=text, reply_text=noop)
+    )
+
+
+def callback_update(data: str) -> SimpleNamespace:
+    user = SimpleNamespace(id=USER_ID, first_name="test", username="test")
+    return SimpleNamespace(
+        effective_user=user, effective_chat=SimpleNamespace(id=USER_ID),
+        callback_query=SimpleNamespace(
+            data=data, from_user=user, answer=noop, edit_message_text=noop,
+            message=SimpleNamespace(chat_id=USER_ID, message_id=1)
+        )
+    )
+
+
+@pytest.fixture
+def strict(monkeypatch):
+    monkeypatch.setattr(escrow, "DB_ROUNDTRIP_STRICT", True)
+
+
+def test_ingestion_handlers_stay_within_budget(strict, journal, bot, monkeypatch):
+    monkeypatch.setattr(escrow, "deal_journal", journal)
+    context = SimpleNamespace(bot=bot, application=SimpleNamespace(create_task=asyncio.create_task), user_data={})
+    pick_fee = callback_update(f"{escrow.CALLBACK_FEE_SELECT_PREFIX}1.0|||#CRY90311")
+    steps = [
+        ("handle_new_deal", message_update(SAMPLE_INR_DEAL)),
+        ("handle_new_deal", message_update(SAMPLE_CRYPTO_DEAL)),
+        ("select_crypto_fee", pick_fee),
+        ("handle_completed_deal_forward", message_update("Deal Completed\nTrade ID: #TRX48213")),
+    ]
+
+    async def main():
+        for name, update in steps:
+            await escrow.instrument_handler(getattr(escrow, name))(update, context)
+
+    before = dict(escrow.HANDLER_ROUND_TRIPS.values)
+    asyncio.run(main())
+    for name, _ in steps:
+        counted = escrow.HANDLER_ROUND_TRIPS.values.get(name, 0) - before.get(name, 0)
+        assert counted <= escrow.HANDLER_ROUNDTRIP_BUDGETS[name], f"{name} made {counted} DB round trips"
+    assert [entry["trade_id"] for entry in journal.pending] == ["#TRX48213", "#CRY90311", "#TRX48213"]
+
+
+async def spawning_handler(update, context):
+    context.application.create_task(escrow.db_query("SELECT 1", fetch="one"))
+
+
+def test_round_trips_in_spawned_tasks_count_against_the_handler(db_run, strict, monkeypatch):
+    monkeypatch.setitem(escrow.HANDLER_ROUNDTRIP_BUDGETS, "spawning_handler", 0)
+    context = SimpleNamespace(application=SimpleNamespace(create_task=asyncio.create_task))
+
+    async def main():
+        with pytest.raises(escrow.RoundTripAssertionError, match="spawning_handler made 1 DB round trips"):
+            await escrow.instrument_handler(spawning_handler)(message_update("hi"), context)
+
+    db_run(main)
+
+
+def test_spawned_tasks_are_checked_once_they_finish(db_run, monkeypatch, caplog):
+    monkeypatch.setitem(escrow.HANDLER_ROUNDTRIP_BUDGETS, "spawning_handler", 0)
+    spawned = []
+    context = SimpleNamespace(application=SimpleNamespace(create_task=lambda coro: spawned.append(asyncio.create_task(coro))))
+
+    async def main():
+        await escrow.instrument_handler(spawning_handler)(message_update("hi"), context)
+        assert "spawning_handler made" not in caplog.text
+        await asyncio.gather(*spawned)
+
+    db_run(main)
+    assert "spawning_handler made 1 DB round trips (budget 0)" in caplog.text
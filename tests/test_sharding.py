@@ -0,0 +1,57 @@
+"""ShardedUpdates: a worker process that dies is restarted with the updates still queued for it, and
+one that keeps dying is reported instead of silently swallowing its shard."""
+import multiprocessing
+import os
+
+import pytest
+
+import escrow
+from conftest import stand_in_update
+
+
+def flaky_worker(index, workers, queue, ready, results):
+    ready.set()
+    while (data := queue.get()) is not None:
+        text = data["text"] if "text" in data else data["message"]["text"]
+        if text == "die":
+            os._exit(3)
+        results.put(text)
+
+
+
+@pytest.fixture
+def router():
+    results = multiprocessing.get_context("spawn").Queue()
+    router = escrow.ShardedUpdates(1, target=flaky_worker, args=(results,))
+    router.results = results
+    router.start()
+    yield router
+    router.stop()
+
+
+def test_dead_worker_is_restarted_and_gets_the_next_update(router):
+    router.queues[0].put({"text": "die"})
+    router.processes[0].join(30)
+    router.route(stand_in_update(text="after"))
+    assert router.results.get(timeout=30) == "after"
+    assert router.processes[0].is_alive()
+
+
+def test_worker_that_keeps_dying_raises(router, monkeypatch):
+    monkeypatch.setattr(escrow, "WORKER_MAX_RESTARTS", 1)
+    router.queues[0].put({"text": "die"})
+    router.processes[0].join(30)
+    router.check_workers()
+    router.queues[0].put({"text": "die"})
+    router.processes[0].join(30)
+    with pytest.raises(escrow.WorkerDiedError):
+        router.check_workers()
+
+
+@pytest.mark.parametrize("workers", [2, 4, 8, 32])
+def test_outbound_budget_split_covers_the_digest_when_it_can(workers):
+    shares = [escrow.worker_outbound_rate(index, workers) for index in range(workers)]
+    assert sum(shares) == pytest.approx(escrow.OUTBOUND_GLOBAL_RATE)
+    assert min(shares) >= min(escrow.OUTBOUND_CHAT_RATE, escrow.OUTBOUND_GLOBAL_RATE / workers)
+    if escrow.OUTBOUND_GLOBAL_RATE - (workers - 1) * escrow.OUTBOUND_CHAT_RATE >= escrow.DIGEST_RATE:
+        assert shares[escrow.ADMIN_WORKER] >= escrow.DIGEST_RATE
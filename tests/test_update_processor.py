@@ -0,0 +1,103 @@
+"""PerUserUpdateProcessor: users overlap, the concurrency limit holds, and each user's updates run
+one at a time in arrival order. No database or Bot API needed."""
+import asyncio
+import random
+
+import escrow
+from conftest import stand_in_update
+
+
+def run_burst(limit: int, users: int, per_user: int, work_ms: float = 2) -> dict:
+    """Submits per_user updates from each user, interleaved the way a burst arrives and one task per
+    update in arrival order, as the Application does. Returns what the handlers observed."""
+
+    async def main():
+        processor = escrow.PerUserUpdateProcessor(limit)
+        seen = {"order": {}, "peak": 0, "overlaps": [], "running": set()}
+
+        async def handle(user_id: int, seq: int):
+            running = seen["running"]
+            if any(uid == user_id for uid, _ in running):
+                seen["overlaps"].append((user_id, seq))
+            running.add((user_id, seq))
+            seen["peak"] = max(seen["peak"], len(running))
+            await asyncio.sleep(random.uniform(0, 2 * work_ms / 1000))
+            running.discard((user_id, seq))
+            seen["order"].setdefault(user_id, []).append(seq)
+
+        arrivals = [(user_id, seq) for seq in range(per_user) for user_id in range(1, users + 1)]
+        await asyncio.gather(*(
+            asyncio.create_task(processor.process_update(stand_in_update(user_id), handle(user_id, seq)))
+            for user_id, seq in arrivals
+        ))
+        seen["locks_left"] = len(processor._user_locks)
+        return seen
+
+    return asyncio.run(main())
+
+
+def test_different_users_overlap():
+    seen = run_burst(limit=16, users=20, per_user=5)
+    assert seen["peak"] >= 2
+
+
+def test_concurrency_limit_holds():
+    seen = run_burst(limit=4, users=30, per_user=5)
+    assert seen["peak"] == 4
+
+
+def test_each_user_runs_in_arrival_order_without_overlap():
+    seen = run_burst(limit=16, users=20, per_user=10)
+    assert seen["overlaps"] == []
+    for user_id, order in seen["order"].items():
+        assert order == list(range(10)), f"user {user_id} ran {order}"
+
+
+def test_user_locks_are_dropped_when_idle():
+    seen = run_burst(limit=8, users=10, per_user=3)
+    assert seen["locks_left"] == 0
+
+
+def test_updates_without_a_user_still_take_a_slot():
+    async def main():
+        processor = escrow.PerUserUpdateProcessor(2)
+        running, peak = 0, 0
+
+        async def handle():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(processor.process_update(stand_in_update(None), handle()) for _ in range(6)))
+        return peak
+
+    assert asyncio.run(main()) == 2
+
+
+def test_reply_waiting_for_rate_limit_gives_its_slot_back():
+    async def main():
+        processor = escrow.PerUserUpdateProcessor(1)
+        scheduler = escrow.OutboundScheduler()
+        scheduler.chat_bucket(1).pause(0.2)  # user 1's chat is over budget for a while
+        events = []
+
+        async def send():
+            events.append("user 1 replied")
+
+        async def replying_handler():
+            await scheduler.process_request(send, (), {}, "sendMessage", {"chat_id": 1}, None)
+            events.append("user 1 done")
+
+        async def quick_handler():
+            events.append("user 2 done")
+
+        first = asyncio.create_task(processor.process_update(stand_in_update(1), replying_handler()))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(first, processor.process_update(stand_in_update(2), quick_handler()))
+        return events, processor._slots._value
+
+    events, free_slots = asyncio.run(main())
+    assert events == ["user 2 done", "user 1 replied", "user 1 done"]
+    assert free_slots == 1
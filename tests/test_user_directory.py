@@ -0,0 +1,52 @@
+"""User directory: prefix search over names, name words and usernames, kept current by incremental
+refreshes that re-index renamed users."""
+import pytest
+
+import escrow
+from conftest import new_user
+
+
+@pytest.fixture
+def empty_directory(monkeypatch):
+    monkeypatch.setattr(escrow, "_user_directory", {})
+    monkeypatch.setattr(escrow, "_user_search_index", [])
+    monkeypatch.setattr(escrow, "_users_by_name", [])
+    monkeypatch.setattr(escrow, "_user_directory_watermark", None)
+    monkeypatch.setattr(escrow, "_user_directory_refreshed_at", 0.0)
+
+
+async def upsert_user(user_id: int, first_name: str, username: str = None):
+    await escrow.db_query(
+        "INSERT INTO users (user_id, first_name, username, last_seen) VALUES (%s, %s, %s, now()) "
+        "ON CONFLICT (user_id) DO UPDATE SET first_name=EXCLUDED.first_name, username=EXCLUDED.username, last_seen=now()",
+        (user_id, first_name, username), fetch="none"
+    )
+
+
+def test_search_by_name_word_and_username_follows_renames(db_run, empty_directory):
+    anna, bob, carl = new_user(), new_user(), new_user()
+
+    async def main():
+        await upsert_user(anna.id, "Zqanna Smith", "zqdesk")
+        await upsert_user(bob.id, "zqbob")
+        await upsert_user(carl.id, "Carl Zqanders")
+        try:
+            await escrow.refresh_user_directory(force=True)
+            found = {prefix: escrow.search_users(prefix) for prefix in ("zq", "ZQAN", "@zqdesk", "zqb", "zqx")}
+            # The rename is picked up by the incremental refresh, not a reload.
+            await upsert_user(bob.id, "Bobby")
+            await escrow.refresh_user_directory(force=True)
+            found["after rename"] = escrow.search_users("zqb"), escrow.search_users("bobby")
+            return found
+        finally:
+            await escrow.db_query("DELETE FROM users WHERE user_id = ANY(%s)", ([anna.id, bob.id, carl.id],), fetch="none")
+
+    found = db_run(main)
+    # Sorted by first name, case-insensitively.
+    assert found["zq"] == [carl.id, anna.id, bob.id]
+    assert found["ZQAN"] == [carl.id, anna.id]
+    assert found["@zqdesk"] == [anna.id]
+    assert found["zqb"] == [bob.id]
+    assert found["zqx"] == []
+    assert found["after rename"] == ([], [bob.id])
+    assert escrow.user_display_label(anna.id) == "Zqanna Smith (@zqdesk)"
@@ -0,0 +1,88 @@
+"""Webhook and health routes, served by the embedded HTTP server: only POSTs carrying the secret
+token are queued, and /healthz reports unavailable while the database pool is closed."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+import escrow
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"},
+        "from": {"id": 7, "is_bot": False, "first_name": "test"}, "text": "hi",
+    },
+}
+
+
+def serve(monkeypatch, requests):
+    """Serves webhook_routes on a free local port, sends `requests(client)` to it and returns what it
+    returned along with the updates that were queued."""
+    monkeypatch.setattr(escrow, "WEBHOOK_URL", "https://bot.example/telegram/hook")
+    monkeypatch.setattr(escrow, "WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(escrow, "db_pool", None)
+
+    async def main():
+        application = SimpleNamespace(bot=None, update_queue=asyncio.Queue(), running=True)
+        server = await escrow.start_http_server("127.0.0.1", 0, escrow.webhook_routes(application))
+        port = server.sockets[0].getsockname()[1]
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+                result = await requests(client)
+        finally:
+            server.close()
+            await server.wait_closed()
+        queued = []
+        while not application.update_queue.empty():
+            queued.append(application.update_queue.get_nowait())
+        return result, queued
+
+    return asyncio.run(main())
+
+
+def test_only_updates_with_the_secret_token_are_queued(monkeypatch):
+    async def requests(client):
+        return [
+            (await client.post("/telegram/hook", json=UPDATE)).status_code,
+            (await client.post("/telegram/hook", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})).status_code,
+            (await client.post("/telegram/hook", content=b"{not json", headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})).status_code,
+            (await client.post("/telegram/hook", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})).status_code,
+            (await client.post("/elsewhere", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})).status_code,
+        ]
+
+    statuses, queued = serve(monkeypatch, requests)
+    assert statuses == [403, 403, 400, 200, 404]
+    assert [update.message.text for update in queued] == ["hi"]
+
+
+def test_oversized_body_is_refused(monkeypatch):
+    async def requests(client):
+        body = json.dumps({**UPDATE, "padding": "x" * escrow.HTTP_MAX_BODY}).encode()
+        return (await client.post("/telegram/hook", content=body, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})).status_code
+
+    status, queued = serve(monkeypatch, requests)
+    assert status == 413
+    assert queued == []
+
+
+def test_healthz_is_unavailable_without_a_database_pool(monkeypatch):
+    async def requests(client):
+        response = await client.get("/healthz")
+        return response.status_code, response.json()
+
+    (status, payload), _ = serve(monkeypatch, requests)
+    assert status == 503
+    assert payload == {"status": "unavailable", "update_queue": 0}
+
+
+def test_healthz_is_ok_with_the_pool_open_and_the_application_running(db_run):
+    application = SimpleNamespace(update_queue=asyncio.Queue(), running=True)
+
+    async def main():
+        return await escrow.health_routes(application)[("GET", "/healthz")]({}, b"")
+
+    status, content_type, payload = db_run(main)
+    assert status == "200 OK"
+    assert json.loads(payload) == {"status": "ok", "update_queue": 0}